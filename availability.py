@@ -0,0 +1,132 @@
+from staff_assignment import catalog
+from borrowing_ledger import get_ledger
+from catalog_cache import CatalogListener
+
+
+# Number of physical copies a catalog record describes (its "copies" field, default 1)
+def copy_count(details):
+    return max(int(details.get("copies", 1)), 0)
+
+
+# Per-copy availability for every catalog title. Each title has copies 1..N (the catalog record's
+# "copies" field, default 1); free and loaned copy ids are kept in insertion-ordered dicts so
+# check-out, check-in and "how many are on the shelf" are all O(1). The table is this process's view
+# for lookups and displays; copies are reserved in the borrowing ledger (record_borrow), which every
+# terminal shares, and refresh_title brings a title back in step with it.
+class AvailabilityTable(CatalogListener):
+    def __init__(self, source=catalog):
+        self._titles = {}  # (item_type, title) -> (free copy ids, loaned copy ids)
+        super().__init__(source)  # Rebuilt from the borrowing ledgers on first use
+
+    # Returns (free, loaned) for a title, registering its copies from the catalog on first touch
+    def _state(self, item_type, title):
+        self._ensure_current()
+        key = (item_type, title)
+        state = self._titles.get(key)
+        if state is None:
+            state = self._assign(item_type, title, ())
+        return state
+
+    # Sets a title's copies from the catalog, with loaned_ids (copy ids from the ledger) on loan
+    def _assign(self, item_type, title, loaned_ids):
+        details = self.source.get().get(item_type, {}).get(title)
+        if details is None:
+            self._titles.pop((item_type, title), None)
+            return None  # Not in the catalog (or has since left it)
+        free = {copy_id: None for copy_id in range(1, copy_count(details) + 1)}
+        loaned = {}
+        for copy_id in loaned_ids:
+            copy_id = int(copy_id) if str(copy_id).isdigit() else None
+            if copy_id not in free:
+                copy_id = next(iter(free), None)  # Legacy loan without a copy id: take any free copy
+            if copy_id is not None:
+                del free[copy_id]
+                loaned[copy_id] = None
+        state = self._titles[(item_type, title)] = (free, loaned)
+        return state
+
+    # Rebuilds the table from the open loans in the borrowing ledgers
+    def rebuild(self, all_items=None):
+        if all_items is None:
+            all_items = self.source.get()
+        self._titles = {}
+        self._generation = self.source.generation
+        for item_type in all_items:
+            ledger = get_ledger(item_type)
+            ledger.load()
+            loans = {}  # title -> [copy_id]
+            for (_, title), (_, _, copy_id) in ledger.open_loans.items():
+                loans.setdefault(title, []).append(copy_id)
+            for title, copy_ids in loans.items():
+                self._assign(item_type, title, copy_ids)
+
+    # Re-reads one title's loans from its borrowing ledger, picking up other terminals' checkouts
+    # and returns
+    def refresh_title(self, item_type, title):
+        self._ensure_current()
+        self._assign(item_type, title, get_ledger(item_type).copies_on_loan(title))
+
+    # Returns how many copies of a title the catalog lists
+    def copies(self, item_type, title):
+        details = self.source.get().get(item_type, {}).get(title)
+        return copy_count(details) if details is not None else 0
+
+    # Reserves a free copy (a specific one if copy_id is given); returns its id, or None if none is free
+    def check_out(self, item_type, title, copy_id=None):
+        state = self._state(item_type, title)
+        if state is None or not state[0]:
+            return None
+        free, loaned = state
+        if copy_id is None:
+            copy_id, _ = free.popitem()
+        elif copy_id in free:
+            del free[copy_id]
+        else:
+            return None
+        loaned[copy_id] = None
+        return copy_id
+
+    # Puts a copy back on the shelf (any loaned copy if copy_id is unknown); returns its id, or None
+    def check_in(self, item_type, title, copy_id=None):
+        state = self._state(item_type, title)
+        if state is None or not state[1]:
+            return None
+        free, loaned = state
+        if copy_id is None or copy_id not in loaned:
+            copy_id, _ = loaned.popitem()
+        else:
+            del loaned[copy_id]
+        free[copy_id] = None
+        return copy_id
+
+    # Returns how many copies of a title are on the shelf
+    def available_copies(self, item_type, title):
+        state = self._state(item_type, title)
+        return len(state[0]) if state else 0
+
+    # Returns how many copies of a title are on loan
+    def loaned_copies(self, item_type, title):
+        state = self._state(item_type, title)
+        return len(state[1]) if state else 0
+
+    def is_available(self, item_type, title, copy_id=None):
+        state = self._state(item_type, title)
+        if state is None:
+            return False
+        return bool(state[0]) if copy_id is None else copy_id in state[0]
+
+    # Keeps the table in step with catalog edits: (re)registers a title's copies, keeping loaned ones out
+    def add_item(self, item_type, title, details, previous=None):
+        if not self.built:
+            return  # The first lookup builds everything from the catalog
+        state = self._titles.pop((item_type, title), None)
+        loaned = state[1] if state else {}
+        free = {copy_id: None for copy_id in range(1, copy_count(details) + 1) if copy_id not in loaned}
+        self._titles[(item_type, title)] = (free, loaned)
+
+    def remove_item(self, item_type, title, details):
+        self._titles.pop((item_type, title), None)
+
+
+# Shared availability table for this process
+availability = AvailabilityTable()
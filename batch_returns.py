@@ -0,0 +1,169 @@
+import csv
+import datetime
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from borrowing_ledger import get_ledger
+from library_item import LibraryItem, ITEM_CLASSES
+from patron import Patron, reconcile_items
+from availability import availability
+from instrumentation import timed, count
+
+
+# Outcome of a batch of returns: how many were checked in and which ones failed
+class ReturnResult:
+    def __init__(self):
+        self.returned = 0  # Items checked back in
+        self.patrons = 0  # Patron records saved (once per patron per batch)
+        self.batches = 0
+        self.failures = []  # (position in the input, message)
+
+    def __str__(self):
+        return (f"Returned {self.returned} items for {self.patrons} patrons in {self.batches} batches, "
+                f"{len(self.failures)} failed.")
+
+
+# Applies one patron's returns to their saved item list, grouped by item type. Pure function of
+# its arguments, so it can run in a worker process. returns is [(position, item_type, title)];
+# gives back (items still on loan, [(position, item_type, title, copy_id)] returned,
+# [(position, message)] failed)
+def apply_patron_returns(patron_name, saved_items, returns):
+    by_type = {}
+    for position, item_type, title in returns:
+        by_type.setdefault(item_type, []).append((position, title))
+
+    held = {(item["type"], item["title"]): item for item in saved_items}
+    returned, failures = [], []
+    for item_type, titles in by_type.items():
+        for position, title in titles:
+            item = held.pop((item_type, title), None)
+            if item is None:
+                failures.append((position, f"{patron_name} does not have {item_type} '{title}' checked out."))
+            else:
+                returned.append((position, item_type, title, item.get("copy_id")))
+    kept = [item for item in saved_items if (item["type"], item["title"]) in held]
+    return kept, returned, failures
+
+
+def _apply_group(group):
+    return apply_patron_returns(*group)
+
+
+# Checks in a stream of (patron_name, item_type, title) returns, e.g. after emptying the book drop.
+# Returns are grouped by patron, applied to each patron's loans in memory (in worker processes
+# when workers > 1) and persisted with one ledger write per item type, one patron-store
+# transaction and one item count change per batch of batch_size returns. Only loans the ledger
+# actually closes are counted; a bad return, or one already taken at a desk, is reported in the
+# result and does not stop the others
+@timed("batch_returns.process")
+def process_returns(returns, date_returned=None, workers=None, batch_size=10_000):
+    if date_returned is None:
+        date_returned = datetime.date.today()
+    result = ReturnResult()
+    executor = ProcessPoolExecutor(workers) if workers and workers > 1 else None
+    batch = []
+    try:
+        for position, record in enumerate(returns, 1):
+            batch.append((position, record))
+            if len(batch) >= batch_size:
+                _process_batch(batch, date_returned, executor, result)
+                batch = []
+        if batch:
+            _process_batch(batch, date_returned, executor, result)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return result
+
+
+def _process_batch(batch, date_returned, executor, result):
+    result.batches += 1
+    groups = {}  # patron_name -> [(position, item_type, title)]
+    for position, record in batch:
+        try:
+            patron_name, item_type, title = record
+        except (TypeError, ValueError):
+            result.failures.append((position, "expected (patron, item type, title)"))
+            continue
+        if item_type not in ITEM_CLASSES:
+            result.failures.append((position, f"unknown item type {item_type!r}"))
+            continue
+        groups.setdefault(patron_name, []).append((position, item_type, title))
+
+    # The ledgers are the record of every loan, so each patron's saved items are brought in step
+    # with them first: a return already taken at a desk is then reported, not counted again
+    saved = Patron.store.load_many(groups)
+    ledger_loans = {item_type: get_ledger(item_type).loans_for_many(groups) for item_type in ITEM_CLASSES}
+    work = []
+    for patron_name, entries in groups.items():
+        items = reconcile_items(patron_name, saved.get(patron_name),
+                                {item_type: loans[patron_name] for item_type, loans in ledger_loans.items()})
+        if patron_name in saved or items:
+            work.append((patron_name, items, entries))
+        else:
+            result.failures.extend((position, f"{patron_name} has no patron record.") for position, _, _ in entries)
+
+    if executor is not None:
+        applied = executor.map(_apply_group, work, chunksize=256)
+    else:
+        applied = map(_apply_group, work)
+
+    ledger_returns = {}  # item_type -> [(patron_name, title)]
+    attempted = []  # (patron_name, items kept, [(position, item_type, title, copy_id)] to return)
+    for (patron_name, _, _), (kept, patron_returned, failures) in zip(work, applied):
+        result.failures.extend(failures)
+        if patron_returned:
+            attempted.append((patron_name, kept, patron_returned))
+            for _, item_type, title, _ in patron_returned:
+                ledger_returns.setdefault(item_type, []).append((patron_name, title))
+
+    # One append per ledger file. Only the loans it closed change availability, the item count and
+    # the patron records; another terminal may have closed one since the ledger was read
+    closed = set()  # (item_type, patron_name, title)
+    for item_type, loans in ledger_returns.items():
+        closed.update((item_type,) + key for key in get_ledger(item_type).record_returns(loans, date_returned))
+    updated = []
+    returned = 0
+    for patron_name, kept, patron_returned in attempted:
+        patron_closed = 0
+        for position, item_type, title, copy_id in patron_returned:
+            if (item_type, patron_name, title) in closed:
+                availability.check_in(item_type, title, copy_id)  # Put the copy back on the shelf
+                patron_closed += 1
+            else:
+                result.failures.append((position, f"{patron_name}'s {item_type} '{title}' was already returned."))
+        if patron_closed:
+            updated.append((patron_name, kept))  # The ledger shows none of the others on loan either
+            returned += patron_closed
+
+    # One transaction for every patron record, one count change
+    if updated:
+        Patron.store.save_many(updated)
+    if returned:
+        LibraryItem.adjust_item_count(returned)
+    result.returned += returned
+    result.patrons += len(updated)
+    count("batch_returns.returned", returned)
+    result.failures.sort()
+
+
+# Yields (patron_name, item_type, title) rows from a CSV file, skipping a "patron,type,title" header
+def iter_returns_csv(filename):
+    with open(filename, 'r', newline='', encoding='utf-8') as file:
+        for row_number, row in enumerate(csv.reader(file)):
+            if row_number == 0 and row and row[0].strip().lower() == "patron":
+                continue
+            if row:
+                yield tuple(field.strip() for field in row)
+
+
+if __name__ == '__main__':
+    # Usage: python batch_returns.py <returns.csv> [workers]
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python batch_returns.py <returns.csv> [workers]")
+        sys.exit(2)
+    LibraryItem.initialize_item_count()
+    result = process_returns(iter_returns_csv(sys.argv[1]), workers=int(sys.argv[2]) if len(sys.argv) > 2 else None)
+    for position, message in result.failures:
+        print(f"Return {position}: {message}")
+    print(result)
+    LibraryItem.flush_item_count()
@@ -0,0 +1,2 @@
+# Benchmarks for the library system; run from the repository root with `python -m benchmarks.<name>`
+# `python -m benchmarks.suite` runs the standard workloads on generated data and reports JSON
@@ -0,0 +1,64 @@
+import contextlib
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.generators import make_catalog, make_patrons, make_loans, write_catalog, write_ledgers, write_patron_store
+
+# Bulk check-in: returns of generated loans through Patron.return_item one at a time, then through
+# batch_returns.process_returns inline and with worker processes. Each path gets its own share of
+# the open loans, so all three run against the same library.
+#   python -m benchmarks.bench_batch_returns [returns per path] [catalog size]
+
+
+def one_at_a_time(returns):
+    from library_item import LibraryItem
+    from patron import Patron
+    for patron_name, item_type, title in returns:
+        patron = Patron.load_patron_data(patron_name)
+        patron.return_item(LibraryItem.from_catalog(item_type, title))
+        patron.save_patron_data()
+
+
+if __name__ == '__main__':
+    per_path = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        data = make_catalog(size)
+        patrons = make_patrons(max(size // 10, 10))
+        loans = make_loans(data, patrons, per_path * 3)
+        write_catalog(data)
+        write_ledgers(loans)
+        write_patron_store(data, patrons, loans)
+        del data
+
+        # Imported only now, so the modules pick up the generated files in this directory
+        from availability import availability
+        from batch_returns import process_returns
+        from library_item import LibraryItem
+        LibraryItem.initialize_item_count()
+        availability.rebuild()
+
+        returns = [(patron_name, item_type, title) for item_type, patron_name, title, _, _, _ in loans]
+        random.Random(5).shuffle(returns)
+        per_path = len(returns) // 3
+        shares = [returns[i * per_path:(i + 1) * per_path] for i in range(3)]
+        shares[1].append(("Nobody", "Book", "Missing"))  # One failure, to show it is reported
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            one_at_a_time(shares[0])
+        single = time.perf_counter() - start
+        print(f"{per_path:,} returns, {size:,} catalog items")
+        print(f"  one at a time:         {single:7.2f}s  {per_path / single:9,.0f} returns/s")
+
+        for label, share, workers in (("batch", shares[1], None), ("batch, 4 processes", shares[2], 4)):
+            start = time.perf_counter()
+            result = process_returns(share, workers=workers)
+            seconds = time.perf_counter() - start
+            print(f"  {label + ':':<22} {seconds:7.2f}s  {result.returned / seconds:9,.0f} returns/s  "
+                  f"({result.returned:,} returned, {len(result.failures)} failed, {seconds and single / seconds:.0f}x)")
+        LibraryItem.flush_item_count()
@@ -0,0 +1,64 @@
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+from borrowing_ledger import BorrowingLedger, format_legacy_line
+
+DATE_BORROWED = datetime.date(2024, 1, 1)
+DUE_DATE = DATE_BORROWED + datetime.timedelta(days=30)
+
+
+# The pre-ledger write path: append, then read, sort and rewrite the whole file
+def legacy_append(filename, patron_name, item_title):
+    with open(filename, 'a') as file:
+        file.write(format_legacy_line(patron_name, item_title, DATE_BORROWED, DUE_DATE))
+    with open(filename, 'r') as file:
+        lines = file.readlines()
+    lines.sort(key=lambda line: line.split(",")[0].split(": ")[1].strip())
+    with open(filename, 'w') as file:
+        file.writelines(lines)
+
+
+def bench_legacy(directory, loans):
+    filename = os.path.join(directory, 'borrowing_data_book.txt')
+    start = time.perf_counter()
+    for i in range(loans):
+        legacy_append(filename, f"Patron {i % 5000}", f"Title {i}")
+    return time.perf_counter() - start
+
+
+def bench_ledger(directory, loans):
+    ledger = BorrowingLedger("Book", os.path.join(directory, 'borrowing_ledger_book.log'))
+    ledger.load()
+
+    start = time.perf_counter()
+    for i in range(loans):
+        ledger.record_borrow(f"Patron {i % 5000}", f"Title {i}", DATE_BORROWED, DUE_DATE)
+    borrow = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ledger.sorted_by_patron()
+    view = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(loans):
+        ledger.record_return(f"Patron {i % 5000}", f"Title {i}", DATE_BORROWED)
+    returns = time.perf_counter() - start
+    ledger.close()
+    return borrow, view, returns
+
+
+if __name__ == '__main__':
+    loans = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    legacy_loans = min(loans, 2_000)
+    with tempfile.TemporaryDirectory() as directory:
+        legacy = bench_legacy(directory, legacy_loans)
+        borrow, view, returns = bench_ledger(directory, loans)
+
+    print(f"legacy rewrite+sort: {legacy_loans:,} borrows in {legacy:.2f}s "
+          f"({legacy_loans / legacy:,.0f} ops/s, cost grows with file size)")
+    print(f"ledger borrow:       {loans:,} borrows in {borrow:.2f}s ({loans / borrow:,.0f} ops/s)")
+    print(f"ledger return:       {loans:,} returns in {returns:.2f}s ({loans / returns:,.0f} ops/s)")
+    print(f"sorted-by-patron view of {loans:,} open loans: {view:.2f}s")
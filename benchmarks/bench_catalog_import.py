@@ -0,0 +1,57 @@
+import json
+import os
+import sys
+import tempfile
+import time
+
+from catalog_browser import CatalogBrowser
+from catalog_cache import CatalogCache
+from catalog_index import CatalogIndex
+from title_search import TitleSearch
+from benchmarks.generators import make_catalog
+
+
+# Times a bulk import of batch_size-record batches into a catalog whose indexes are already built,
+# followed by the search and browse that sort the new titles in
+def run(size, imported, batch_size=1000):
+    data = make_catalog(size + imported)
+    new_records = []
+    for item_type, items in data.items():
+        for title in list(items)[::(size + imported) // imported or 1]:
+            new_records.append((item_type, title, items.pop(title)))
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'staff_assignment.txt')
+        with open(filename, 'w') as file:
+            json.dump(data, file)
+        cache = CatalogCache(filename)
+        search, browser, index = TitleSearch(source=cache), CatalogBrowser(source=cache), CatalogIndex(source=cache)
+
+        start = time.perf_counter()
+        for listener in (search, browser, index):
+            listener.rebuild()
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for first in range(0, len(new_records), batch_size):
+            batch = new_records[first:first + batch_size]
+            for item_type in data:
+                records = [(title, details) for found_type, title, details in batch if found_type == item_type]
+                if records:
+                    cache.set_items(item_type, records)
+        search.prefix("ka")
+        browser.page(0)
+        elapsed = time.perf_counter() - start
+
+        item_type, title, _ = new_records[-1]
+        assert (item_type, title) in search.prefix(title, 50)
+        assert browser.count() == sum(len(items) for items in cache.get().values())
+    print(f"  {len(new_records):,} records in batches of {batch_size:,}: {elapsed:.2f}s "
+          f"({len(new_records) / elapsed:,.0f} records/s; full index build {build:.2f}s)")
+
+
+if __name__ == '__main__':
+    # Usage: python -m benchmarks.bench_catalog_import [catalog size] [records imported]
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    imported = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+    print(f"Bulk import into a {size:,}-item catalog with built indexes")
+    run(size, imported)
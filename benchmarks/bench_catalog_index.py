@@ -0,0 +1,44 @@
+import sys
+import time
+
+from catalog_index import CatalogIndex
+from benchmarks.generators import AUTHORS, STAFF, SyntheticCatalog, make_catalog
+
+
+# Answers the same query the old way: walk every record of every type
+def linear_find(data, field, value):
+    return [(item_type, title) for item_type, items in data.items()
+            for title, details in items.items() if details.get(field) == value]
+
+
+def time_call(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def run(size):
+    data = make_catalog(size)
+    index = CatalogIndex(source=SyntheticCatalog(data))
+
+    start = time.perf_counter()
+    index.rebuild()
+    build = time.perf_counter() - start
+
+    queries = [("author", AUTHORS[7]), ("shelf_location", "A42"), ("staff", STAFF[1]),
+               ("ISBN", f"978-{(size // 2) - (size // 2) % 3:010d}")]
+    print(f"\n{size:,} items (index build {build:.2f}s)")
+    for field, value in queries:
+        indexed = time_call(lambda: index.find(field, value), 200)
+        linear = time_call(lambda: linear_find(data, field, value), 1 if size >= 100_000 else 5)
+        assert sorted(index.find(field, value)) == sorted(linear_find(data, field, value))
+        hits = index.count(field, value)
+        print(f"  {field:<15} {hits:>7} hits  index {indexed * 1e6:10.1f}us  "
+              f"scan {linear * 1e3:9.1f}ms  speedup {linear / indexed:,.0f}x")
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    for size in sizes:
+        run(size)
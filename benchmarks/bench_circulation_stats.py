@@ -0,0 +1,83 @@
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.generators import make_catalog, make_patrons, write_catalog
+
+# Loads a generated loan history of N events (half borrows, half returns) spread over history
+# segments, then times each statistic. Run once with NumPy and, on a tenth of the events, with
+# the stdlib fallback.
+#   python -m benchmarks.bench_circulation_stats [events]
+SEGMENTS_PER_TYPE = 10
+FIRST_DAY = datetime.date(2023, 1, 1)
+
+
+# Writes the events straight into loan_history/ as archived ledger logs
+def write_history(data, patrons, events, seed=11):
+    rng = random.Random(seed)
+    os.makedirs('loan_history', exist_ok=True)
+    per_segment = events // (2 * len(data) * SEGMENTS_PER_TYPE)
+    for item_type, items in data.items():
+        titles = list(items)
+        weights = [1 / (rank + 1) for rank in range(len(titles))]  # A few titles are very popular
+        day = FIRST_DAY.toordinal()
+        for segment in range(SEGMENTS_PER_TYPE):
+            lines = []
+            picks = rng.choices(titles, weights, k=per_segment)
+            for title in picks:
+                patron = rng.choice(patrons)
+                borrowed = datetime.date.fromordinal(day + rng.randrange(30)).isoformat()
+                returned = datetime.date.fromordinal(day + 30 + rng.randrange(30)).isoformat()
+                lines.append(f"B\t{patron}\t{title}\t{borrowed}\t{returned}\t1\nR\t{patron}\t{title}\t{returned}\n")
+            day += 30
+            with open(os.path.join('loan_history', f"{item_type.lower()}-{segment:04d}-{segment}.log"), 'w') as file:
+                file.writelines(lines)
+
+
+def timed(label, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    print(f"  {label:<34} {time.perf_counter() - start:7.2f}s")
+    return result
+
+
+def run(label):
+    import circulation_stats
+    print(f"{label}:")
+    history = timed("load (parse, write .events caches)", circulation_stats.LoanHistory.load)
+    history = timed("load (from .events caches)", circulation_stats.LoanHistory.load)
+    print(f"  {len(history):,} events, {len(history.titles):,} titles, {len(history.patrons):,} patrons")
+    timed("top 10 titles", history.top_titles, 10)
+    timed("loans by genre", history.loans_by, "genre")
+    timed("loans by author", history.loans_by, "author")
+    timed("loans by director", history.loans_by, "director")
+    timed("staff workload per station", history.loans_by, ("staff", "station"))
+    timed("average loan length", history.average_loan_days)
+    timed("average loan length by genre", history.average_loan_days, None, None, "genre")
+    day = FIRST_DAY + datetime.timedelta(days=45)
+    timed(f"daily stats for {day}", circulation_stats.daily_stats, history, day)
+
+
+if __name__ == '__main__':
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        data = make_catalog(100_000)
+        write_catalog(data)
+        patrons = make_patrons(50_000)
+        start = time.perf_counter()
+        write_history(data, patrons, events)
+        print(f"generated {events:,} events in {time.perf_counter() - start:.1f}s")
+        run("NumPy" if __import__("circulation_stats").numpy is not None else "stdlib arrays (NumPy not installed)")
+
+    if __import__("circulation_stats").numpy is not None:
+        import circulation_stats
+        circulation_stats.numpy = None
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            write_catalog(data)
+            write_history(data, patrons, events // 10)
+            run(f"stdlib arrays, {events // 10:,} events")
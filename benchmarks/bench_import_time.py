@@ -0,0 +1,44 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.generators import make_catalog
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Before: importing main parsed the catalog. Forcing the load right after the import reproduces that cost.
+SCENARIOS = {
+    "import main (eager, old behavior)": "import main, staff_assignment; staff_assignment.catalog.get()",
+    "import main (lazy catalog)": "import main",
+}
+
+
+# Runs `python -X importtime -c code` in directory and returns (cumulative us for main, wall seconds)
+def run(code, directory):
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    timed = f"import time; _start = time.perf_counter(); {code}; print(time.perf_counter() - _start)"
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", timed], cwd=directory, env=env,
+                               capture_output=True, text=True, check=True)
+    main_us = None
+    for line in completed.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|\s+main$", line)
+        if match:
+            main_us = int(match.group(1))
+    return main_us, float(completed.stdout.strip())
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    repeat = 3
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, 'staff_assignment.txt'), 'w') as file:
+            json.dump(make_catalog(size), file, indent=4)
+        print(f"Catalog with {size:,} items ({os.path.getsize(os.path.join(directory, 'staff_assignment.txt')) / 2**20:.1f} MiB)")
+        for label, code in SCENARIOS.items():
+            results = [run(code, directory) for _ in range(repeat)]
+            main_us = min(result[0] for result in results)
+            wall = min(result[1] for result in results)
+            print(f"  {label:<36} importtime(main) {main_us / 1000:8.1f} ms   total {wall * 1000:8.1f} ms")
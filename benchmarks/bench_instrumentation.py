@@ -0,0 +1,57 @@
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+import instrumentation
+from borrowing_ledger import BorrowingLedger
+
+DATE_BORROWED = datetime.date(2024, 1, 1)
+DUE_DATE = DATE_BORROWED + datetime.timedelta(days=30)
+
+
+def noop():
+    pass
+
+
+timed_noop = instrumentation.timed("bench.noop")(noop)
+
+
+def per_call(func, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def circulation(directory, loans):
+    ledger = BorrowingLedger("Book", os.path.join(directory, f'ledger_{time.perf_counter_ns()}.log'))
+    start = time.perf_counter()
+    for i in range(loans):
+        ledger.record_borrow(f"Patron {i % 500}", f"Title {i}", DATE_BORROWED, DUE_DATE)
+        ledger.record_return(f"Patron {i % 500}", f"Title {i}", DATE_BORROWED)
+    ledger.close()
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    loans = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    calls = 2_000_000
+
+    instrumentation.disable()
+    bare = per_call(noop, calls)
+    disabled = per_call(timed_noop, calls)
+    instrumentation.enable()
+    enabled = per_call(timed_noop, calls)
+    print(f"call overhead: bare {bare:.0f} ns, instrumented+disabled {disabled:.0f} ns, "
+          f"instrumented+enabled {enabled:.0f} ns")
+
+    with tempfile.TemporaryDirectory() as directory:
+        instrumentation.disable()
+        circulation(directory, loans // 10)  # Warm up
+        off = min(circulation(directory, loans) for _ in range(3))
+        instrumentation.enable()
+        on = min(circulation(directory, loans) for _ in range(3))
+    print(f"ledger borrow+return x{loans:,}: disabled {off:.2f}s, enabled {on:.2f}s "
+          f"({(on - off) / off:+.1%})")
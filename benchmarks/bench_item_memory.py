@@ -0,0 +1,84 @@
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.generators import make_catalog
+
+
+# Book as it was built before __slots__ and shared catalog entries: one __dict__ per object
+class LegacyBook:
+    def __init__(self, title, author, genre, ISBN, pages, publication_year, language, shelf_location, condition,
+                 staff):
+        self._title = title
+        self._item_type = "Book"
+        self.available = True
+        self.staff = staff
+        self.publication_year = publication_year
+        self.language = language
+        self.shelf_location = shelf_location
+        self.condition = condition
+        self._author = author
+        self._genre = genre
+        self.ISBN = ISBN
+        self.pages = pages
+
+
+def build_legacy(books, titles):
+    items = []
+    for title in titles:
+        data = books[title]
+        items.append(LegacyBook(title, data.get("author"), data.get("genre"), data.get("ISBN", "N/A"),
+                                data.get("pages", 0), data.get("publication_year", "Unknown"),
+                                data.get("language", "English"), data.get("shelf_location", "General"),
+                                data.get("condition", "Good"), data))
+    return items
+
+
+def build_shared(library_item, titles):
+    return [library_item.LibraryItem.from_catalog("Book", title) for title in titles]
+
+
+# Runs build() under tracemalloc and reports retained and peak bytes per item
+def measure(label, build, count):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    items = build()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del items
+    gc.collect()
+    print(f"  {label:<28} {current / count:7.1f} B/item retained  {peak / 2**20:8.1f} MiB peak  {elapsed:6.2f}s")
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    hot_titles = 10_000
+    catalog_data = make_catalog(size * 3)  # make_catalog spreads items over three types
+    books = catalog_data["Book"]
+
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, 'staff_assignment.txt'), 'w') as file:
+            json.dump(catalog_data, file)
+        del catalog_data
+        os.chdir(directory)
+        import library_item  # Loads the synthetic catalog through the normal catalog cache
+
+        books = library_item.catalog.get()["Book"]
+        all_titles = list(books)
+        repeated = [all_titles[i % hot_titles] for i in range(len(all_titles))]
+        print(f"{len(all_titles):,} Book objects, one per catalog title")
+        measure("legacy __dict__ objects", lambda: build_legacy(books, all_titles), len(all_titles))
+        library_item.LibraryItem._entry_cache.entries.clear()
+        measure("__slots__ + shared entries", lambda: build_shared(library_item, all_titles), len(all_titles))
+
+        print(f"{len(repeated):,} Book objects over {hot_titles:,} distinct titles")
+        measure("legacy __dict__ objects", lambda: build_legacy(books, repeated), len(repeated))
+        library_item.LibraryItem._entry_cache.entries.clear()
+        measure("__slots__ + shared entries", lambda: build_shared(library_item, repeated), len(repeated))
+        os.chdir('/')
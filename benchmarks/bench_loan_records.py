@@ -0,0 +1,79 @@
+import json
+import os
+import sys
+import tempfile
+import time
+
+from borrowing_ledger import format_legacy_line, parse_legacy_line, parse_record, _escape, BORROW
+from loan_records import LoanFile, write_sorted
+
+
+def make_loans(count):
+    return [(f"Patron {i % 20_000:05d}", f"Title {i}, Volume {i % 7}", "2024-01-01", "2024-01-31", str(i % 3 + 1))
+            for i in range(count)]
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def parse_text(filename):
+    with open(filename, 'r', encoding='utf-8') as file:
+        return [parse_legacy_line(line) for line in file]
+
+
+def parse_ledger(filename):
+    with open(filename, 'r', encoding='utf-8') as file:
+        return [parse_record(line) for line in file]
+
+
+def parse_jsonl(filename):
+    with open(filename, 'r', encoding='utf-8') as file:
+        return [json.loads(line) for line in file]
+
+
+def parse_binary(filename):
+    with LoanFile(filename) as loans:
+        return list(loans)
+
+
+# The original lookup: scan every line of the text file for the patron's name
+def text_lookup(filename, patron_name):
+    with open(filename, 'r', encoding='utf-8') as file:
+        return [line for line in file if f"Patron Name: {patron_name}," in line]
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    loans = make_loans(count)
+    with tempfile.TemporaryDirectory() as directory:
+        files = {name: os.path.join(directory, name) for name in ("loans.txt", "loans.log", "loans.jsonl", "loans.bin")}
+        with open(files["loans.txt"], 'w', encoding='utf-8') as file:
+            file.writelines(format_legacy_line(*loan[:4]) for loan in loans)
+        with open(files["loans.log"], 'w', encoding='utf-8') as file:
+            file.writelines("\t".join(_escape(field) for field in (BORROW,) + loan) + "\n" for loan in loans)
+        with open(files["loans.jsonl"], 'w', encoding='utf-8') as file:
+            file.writelines(json.dumps(loan) + "\n" for loan in loans)
+        _, write = timed(lambda: write_sorted(files["loans.bin"], loans))
+
+        print(f"{count:,} loans (binary file written in {write:.2f}s)")
+        for label, parse, filename in (("legacy text", parse_text, "loans.txt"),
+                                       ("ledger TSV", parse_ledger, "loans.log"),
+                                       ("JSON Lines", parse_jsonl, "loans.jsonl"),
+                                       ("binary (mmap)", parse_binary, "loans.bin")):
+            _, seconds = timed(lambda: parse(files[filename]))
+            size = os.path.getsize(files[filename])
+            print(f"  full parse  {label:<14} {count / seconds:>12,.0f} records/s  {size / 2 ** 20:7.1f} MiB")
+
+        patrons = [f"Patron {i:05d}" for i in range(0, 20_000, 2_000)]
+        _, seconds = timed(lambda: [text_lookup(files["loans.txt"], patron) for patron in patrons])
+        print(f"  patron lookup, text scan     {seconds / len(patrons) * 1000:10.2f} ms")
+        with LoanFile(files["loans.bin"]) as loan_file:
+            _, opened = timed(lambda: LoanFile(files["loans.bin"]).close())
+            found, seconds = timed(lambda: [loan_file.find_patron(patron) for patron in patrons])
+            print(f"  patron lookup, binary index  {seconds / len(patrons) * 1000:10.2f} ms "
+                  f"({len(found[0])} loans each; open {opened * 1000:.2f} ms)")
+            _, seconds = timed(lambda: [loan_file.get(patron, loans[0][1]) for patron in patrons])
+            print(f"  patron+title lookup, binary  {seconds / len(patrons) * 1000:10.3f} ms")
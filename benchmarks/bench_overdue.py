@@ -0,0 +1,75 @@
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import overdue_report
+from borrowing_ledger import get_ledger, _escape, BORROW, RETURN
+
+AS_OF = datetime.date(2024, 6, 1)
+
+
+# Writes a synthetic ledger log straight to disk: loans borrowed over the 90 days before AS_OF, with
+# a quarter of them already returned
+def write_ledger(filename, loans, seed=3):
+    rng = random.Random(seed)
+    with open(filename, 'w', encoding='utf-8') as file:
+        for i in range(loans):
+            borrowed = AS_OF - datetime.timedelta(days=rng.randint(0, 90))
+            due = borrowed + datetime.timedelta(days=30)
+            record = (BORROW, f"Patron {i % 50_000}", f"Title {i}", borrowed, due, rng.randint(1, 3))
+            file.write("\t".join(_escape(field) for field in record) + "\n")
+            if rng.random() < 0.25:
+                file.write("\t".join(_escape(field) for field in (RETURN, record[1], record[2], due)) + "\n")
+
+
+def linear_overdue(cutoff):
+    # What answering "overdue" cost before: look at every open loan of every type
+    found = []
+    for item_type in overdue_report.ITEM_TYPES:
+        for (patron_name, item_title), (date_borrowed, due_date, copy_id) in get_ledger(item_type).open_loans.items():
+            if due_date < cutoff:
+                found.append((due_date, item_type, patron_name, item_title, date_borrowed, copy_id))
+    found.sort()
+    return found
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    loans = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        per_type = loans // len(overdue_report.ITEM_TYPES)
+        for item_type in overdue_report.ITEM_TYPES:
+            write_ledger(get_ledger(item_type).filename, per_type, seed=len(item_type))
+
+        _, load = timed(lambda: [get_ledger(item_type).load() for item_type in overdue_report.ITEM_TYPES])
+        _, build = timed(lambda: list(overdue_report.due_within(0, AS_OF)))
+        print(f"{loans:,} loans: ledgers loaded in {load:.2f}s, due-date index built in {build:.2f}s")
+
+        for label, query in (
+                ("due today", lambda: list(overdue_report.due_within(0, AS_OF))),
+                ("overdue by 1 week+", lambda: list(overdue_report.overdue(AS_OF - datetime.timedelta(days=53)))),
+                ("due in next 3 days", lambda: list(overdue_report.due_within(3, AS_OF))),
+                ("all overdue", lambda: list(overdue_report.overdue(AS_OF)))):
+            found, seconds = timed(query)
+            print(f"  {label:<20} {len(found):>9,} loans in {seconds * 1000:8.1f} ms")
+        found, seconds = timed(linear_overdue, (AS_OF - datetime.timedelta(days=53)).isoformat())
+        print(f"  {'linear scan (1 week)':<20} {len(found):>9,} loans in {seconds * 1000:8.1f} ms")
+
+        for item_type in overdue_report.ITEM_TYPES:
+            get_ledger(item_type).__init__(item_type)  # Drop the in-memory index; the report reads the files
+        tracemalloc.start()
+        rows, seconds = timed(overdue_report.nightly_report, 'nightly.csv', AS_OF, overdue_report.ITEM_TYPES, 50_000)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"nightly report: {rows:,} overdue rows in {seconds:.1f}s (under tracemalloc), "
+              f"peak {peak / 2 ** 20:.1f} MiB with 50,000-record chunks")
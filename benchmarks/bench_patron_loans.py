@@ -0,0 +1,48 @@
+import time
+
+from patron import LoanSet
+
+# Duplicate check + return + re-borrow on a patron holding many loans: the old list scans
+# (any() for duplicates, a comprehension rebuild on return) against LoanSet
+#   python -m benchmarks.bench_patron_loans
+
+
+class Item:
+    __slots__ = ("_item_type", "_title")
+
+    def __init__(self, item_type, title):
+        self._item_type = item_type
+        self._title = title
+
+
+def list_cycle(items, item):
+    # What borrow_item/return_item did before
+    if any(i._title == item._title and i._item_type == item._item_type for i in items):
+        items = [i for i in items if not (i._title == item._title and i._item_type == item._item_type)]
+    items.append(item)
+    return items
+
+
+def loan_set_cycle(loans, item):
+    if item in loans:
+        loans.remove(item._item_type, item._title)
+    loans.add(item)
+    return loans
+
+
+def per_op(cycle, loans, items, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for item in items:
+            loans = cycle(loans, item)
+    return (time.perf_counter() - start) / (rounds * len(items)) * 1e6
+
+
+if __name__ == '__main__':
+    print(f"{'loans':>6}  {'list scan':>10}  {'LoanSet':>10}  (microseconds per duplicate check + return + borrow)")
+    for size in (5, 100, 500, 5000):
+        items = [Item("Book", f"Title {i}") for i in range(size)]
+        rounds = max(20_000 // size, 2)
+        scan = per_op(list_cycle, list(items), items, rounds)
+        keyed = per_op(loan_set_cycle, LoanSet(items), items, rounds)
+        print(f"{size:>6}  {scan:>10.2f}  {keyed:>10.2f}")
@@ -0,0 +1,86 @@
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.generators import make_catalog, make_patrons, make_loans, write_catalog, write_ledgers
+
+# Restart time and per-transaction write cost of the circulation state.
+#   python -m benchmarks.bench_persistence [open loans]
+# Restart is timed in a fresh process (persistence.recover) three ways: ledgers that are one long
+# log, the same loans as a snapshot after a checkpoint, and a snapshot plus a log tail
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATE_BORROWED = datetime.date(2024, 1, 1)
+DUE_DATE = DATE_BORROWED + datetime.timedelta(days=30)
+
+
+def restart(directory):
+    completed = subprocess.run([sys.executable, "-m", "benchmarks.bench_persistence", "--recover"], cwd=directory,
+                               env=dict(os.environ, PYTHONPATH=REPO_ROOT), capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout)
+
+
+def per_transaction(func, count):
+    start = time.perf_counter()
+    for i in range(count):
+        func(i)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ["--recover"]:
+        start = time.perf_counter()
+        from persistence import recover
+        timings = recover()
+        json.dump({"seconds": time.perf_counter() - start, "ledgers": sum(value for step, value in timings.items()
+                                                                          if step.startswith("ledger"))}, sys.stdout)
+        sys.exit(0)
+
+    loans = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        data = make_catalog(loans * 2)
+        loan_list = make_loans(data, make_patrons(max(loans // 4, 10)), loans)
+        write_catalog(data)
+        write_ledgers(loan_list)
+        with open('item_count.json', 'w') as file:
+            json.dump(len(loan_list), file)
+        del data
+
+        print(f"{len(loan_list):,} open loans")
+        log_only = restart(directory)
+        from persistence import checkpoint, recover
+        recover()
+        start = time.perf_counter()
+        checkpoint()
+        print(f"  checkpoint (write snapshots): {time.perf_counter() - start:6.2f}s")
+        snapshot = restart(directory)
+
+        from borrowing_ledger import get_ledger
+        ledger = get_ledger("Book")
+        tail = len(loan_list) // 10
+        for i in range(tail):
+            ledger.record_borrow(f"Tail Patron {i % 1000}", f"Tail Title {i}", DATE_BORROWED, DUE_DATE, "1")
+        with_tail = restart(directory)
+        for label, result in (("restart, log only", log_only), ("restart, snapshot", snapshot),
+                              (f"restart, snapshot + {tail:,} log records", with_tail)):
+            print(f"  {label + ':':<40} {result['seconds']:6.2f}s (ledgers {result['ledgers']:.2f}s)")
+
+        print("per-transaction write cost (microseconds):")
+        from library_item import LibraryItem
+        from patron import Patron
+        ledger.compaction_min_records = 10 ** 9  # Time the appends alone; compaction is timed above
+        cycle = lambda i: (ledger.record_borrow("Bench", f"Bench {i}", DATE_BORROWED, DUE_DATE, "1"),
+                           ledger.record_return("Bench", f"Bench {i}", DATE_BORROWED))
+        print(f"  ledger borrow + return, flushed:      {per_transaction(cycle, 5000):8.1f}")
+        ledger.durable = True
+        print(f"  ledger borrow + return, fsynced:      {per_transaction(cycle, 500):8.1f}")
+        ledger.durable = False
+        print(f"  item count change (logged):           {per_transaction(lambda i: LibraryItem.adjust_item_count(1), 5000):8.1f}")
+        LibraryItem.flush_item_count()
+        items = [{"title": f"Bench {i}", "type": "Book", "copy_id": 1} for i in range(5)]
+        print(f"  patron record save (SQLite WAL):      {per_transaction(lambda i: Patron.store.save(f'Bench {i % 100}', items), 2000):8.1f}")
+        Patron.store.close()
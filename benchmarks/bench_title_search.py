@@ -0,0 +1,42 @@
+import random
+import statistics
+import sys
+import time
+
+from title_search import TitleSearch
+from benchmarks.generators import SyntheticCatalog, make_titled_catalog, misspell
+
+
+def latency(func, queries):
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        func(query)
+        timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    return statistics.mean(timings), timings[len(timings) // 2], timings[int(len(timings) * 0.99)]
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(1)
+    data = make_titled_catalog(size)
+    search = TitleSearch(fields=(), source=SyntheticCatalog(data))
+    start = time.perf_counter()
+    search.rebuild()
+    print(f"{size:,} titles, index built in {time.perf_counter() - start:.1f}s")
+
+    titles = [title for items in data.values() for title in items]
+    sample = [title for title in rng.sample(titles, 2000) if len(title) > 4]
+    typos = [misspell(title, rng) for title in sample]
+    found = sum(1 for title, typo in zip(sample, typos) if title in [hit[2] for hit in search.fuzzy(typo, 5)])
+    workloads = {
+        "prefix (3 chars)": (lambda query: search.prefix(query, 10), [title[:3] for title in sample]),
+        "prefix (6 chars)": (lambda query: search.prefix(query, 10), [title[:6] for title in sample]),
+        "fuzzy (1 typo)": (lambda query: search.fuzzy(query, 10), typos),
+        "desk search (1 typo)": (lambda query: search.search(query, 10), typos),
+    }
+    for label, (func, queries) in workloads.items():
+        mean, p50, p99 = latency(func, queries)
+        print(f"  {label:<22} mean {mean:8.1f}us  p50 {p50:8.1f}us  p99 {p99:8.1f}us")
+    print(f"  misspelled title found in fuzzy top 5: {found / len(typos):.1%}")
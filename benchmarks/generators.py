@@ -0,0 +1,163 @@
+import datetime
+import json
+import os
+import random
+
+from borrowing_ledger import _escape, BORROW
+from patron_store import PatronStore
+
+# Synthetic library data for the benchmarks. Everything is derived from a seed, so the same
+# arguments always produce the same catalog, patrons and loans
+
+AUTHORS = [f"Author {i}" for i in range(2000)]
+DIRECTORS = [f"Director {i}" for i in range(500)]
+GENRES = ["Fantasy", "Classic", "Dystopian", "Romance", "Drama", "Sci-Fi", "Horror", "History"]
+STAFF = ["Malou Wang", "James Foley", "Lisa Zhang", "Tina Moran", "Ping Guerrero"]
+SYLLABLES = ["ka", "lo", "mi", "ra", "the", "on", "sel", "dor", "an", "tri", "vel", "mar", "os", "in", "qu",
+             "ber", "sta", "lin", "gor", "fe", "ne", "wy", "zu", "pha", "cro", "ish", "ul", "ten", "bri", "ad"]
+FIRST_NAMES = ["Ana", "Ben", "Carla", "Dev", "Elif", "Femi", "Grace", "Hiro", "Ines", "Jonah", "Kofi", "Lena"]
+LAST_NAMES = ["Reyes", "Okafor", "Larsen", "Nguyen", "Haddad", "Silva", "Kowalski", "Tanaka", "Murphy", "Cruz"]
+TODAY = datetime.date(2024, 6, 1)  # Fixed "today" for generated loan dates
+
+
+# Minimal stand-in for CatalogCache that serves a synthetic catalog
+class SyntheticCatalog:
+    def __init__(self, data):
+        self.data = data
+        self.generation = 1
+        self.listeners = []
+
+    def get(self):
+        return self.data
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+
+def _vocabulary(rng, size=30_000):
+    return list({"".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(size)})
+
+
+# Builds a catalog with the same fields as staff_assignment.txt. Titles are "Book 12" style, or
+# made of pronounceable pseudo-words with word_titles=True (for search workloads)
+def make_catalog(size, seed=42, word_titles=False):
+    rng = random.Random(seed)
+    words = _vocabulary(random.Random(seed + 1)) if word_titles else None
+    data = {"Book": {}, "Magazine": {}, "DVD": {}}
+    for i in range(size):
+        station = rng.randint(1, 5)
+        common = {
+            "staff": STAFF[station - 1],
+            "station": station,
+            "publication_year": rng.randint(1800, 2024),
+            "language": "English",
+            "shelf_location": f"{'ABC'[i % 3]}{rng.randint(1, 500)}",
+            "condition": "Good",
+        }
+        kind = i % 3
+        item_type = ("Book", "Magazine", "DVD")[kind]
+        title = f"{item_type} {i}"
+        if words:
+            title = " ".join(rng.choice(words) for _ in range(rng.randint(1, 4))).title()
+            while title in data[item_type]:
+                title += f" {rng.randint(2, 99)}"
+        if kind == 0:
+            data["Book"][title] = dict(common, author=rng.choice(AUTHORS), genre=rng.choice(GENRES),
+                                       ISBN=f"978-{i:010d}", pages=rng.randint(50, 900))
+        elif kind == 1:
+            data["Magazine"][title] = dict(common, issue="May 2024", issue_number=rng.randint(1, 12))
+        else:
+            data["DVD"][title] = dict(common, director=rng.choice(DIRECTORS), genre=rng.choice(GENRES),
+                                      duration="2h 0m")
+    return data
+
+
+# Builds a catalog of size titles made of pronounceable pseudo-words, with only the fields needed
+# to route a checkout (cheap enough for million-title search benchmarks)
+def make_titled_catalog(size, seed=7):
+    rng = random.Random(seed)
+    words = _vocabulary(rng)
+    data = {"Book": {}, "Magazine": {}, "DVD": {}}
+    item_types = list(data)
+    while sum(len(items) for items in data.values()) < size:
+        title = " ".join(rng.choice(words) for _ in range(rng.randint(1, 4))).title()
+        data[rng.choice(item_types)][title] = {"staff": "Lisa Zhang", "station": 4}
+    return data
+
+
+# Introduces one random typo (substitution, deletion or transposition)
+def misspell(text, rng):
+    position = rng.randrange(1, len(text) - 1)
+    kind = rng.randrange(3)
+    if kind == 0:
+        return text[:position] + rng.choice("aeioustr") + text[position + 1:]
+    if kind == 1:
+        return text[:position] + text[position + 1:]
+    return text[:position - 1] + text[position] + text[position - 1] + text[position + 1:]
+
+
+# Returns count distinct patron names
+def make_patrons(count, seed=42):
+    rng = random.Random(seed)
+    return [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}" for i in range(count)]
+
+
+# Returns up to count open loans as (item_type, patron_name, title, date_borrowed, due_date, copy_id).
+# Each title is lent at most once and no patron holds more than max_per_patron items, so the
+# loans are consistent with single-copy titles and the patron limit
+def make_loans(data, patrons, count, seed=42, max_per_patron=5):
+    rng = random.Random(seed)
+    titles = [(item_type, title) for item_type, items in data.items() for title in items]
+    count = min(count, len(titles), len(patrons) * max_per_patron)
+    held = {}
+    loans = []
+    for item_type, title in rng.sample(titles, count):
+        patron_name = rng.choice(patrons)
+        while held.get(patron_name, 0) >= max_per_patron:
+            patron_name = rng.choice(patrons)
+        held[patron_name] = held.get(patron_name, 0) + 1
+        borrowed = TODAY - datetime.timedelta(days=rng.randint(0, 60))
+        loans.append((item_type, patron_name, title, borrowed.isoformat(),
+                      (borrowed + datetime.timedelta(days=30)).isoformat(), "1"))
+    return loans
+
+
+# Writes staff_assignment.txt for a catalog into directory
+def write_catalog(data, directory="."):
+    with open(os.path.join(directory, 'staff_assignment.txt'), 'w') as file:
+        json.dump(data, file)
+
+
+# Writes loans straight into the borrowing ledger files (one borrow record each) in directory
+def write_ledgers(loans, directory="."):
+    files = {}
+    try:
+        for item_type, patron_name, title, borrowed, due, copy_id in loans:
+            file = files.get(item_type)
+            if file is None:
+                file = files[item_type] = open(os.path.join(directory, f'borrowing_ledger_{item_type.lower()}.log'),
+                                               'w', encoding='utf-8')
+            file.write("\t".join(_escape(field) for field in (BORROW, patron_name, title, borrowed, due, copy_id))
+                       + "\n")
+    finally:
+        for file in files.values():
+            file.close()
+
+
+# Fills patrons.db in directory with every patron, holding the items they have on loan
+def write_patron_store(data, patrons, loans, directory="."):
+    items = {patron_name: [] for patron_name in patrons}
+    for item_type, patron_name, title, _, _, copy_id in loans:
+        details = data[item_type][title]
+        items[patron_name].append({"title": title, "type": item_type,
+                                   "publication_year": details.get("publication_year", "Unknown"),
+                                   "language": details.get("language", "English"),
+                                   "shelf_location": details.get("shelf_location", "General"),
+                                   "condition": details.get("condition", "Good"), "copy_id": int(copy_id)})
+    store = PatronStore(os.path.join(directory, 'patrons.db'), legacy_filename=None)
+    connection = store._connect()
+    with connection:
+        connection.executemany("INSERT OR REPLACE INTO patrons (name, items) VALUES (?, ?)",
+                               ((name, json.dumps(held)) for name, held in items.items()))
+        connection.execute("UPDATE meta SET value = ? WHERE key = 'patron_count'", (len(items),))
+    store.close()
@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# One simulated desk terminal: a single connection issuing a search/borrow/return/status mix
+async def client(number, host, port, requests, titles, latencies, seed):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    patron = f"Load Patron {number}"
+    borrowed = []
+
+    async def call(request):
+        start = time.perf_counter()
+        writer.write((json.dumps(request) + "\n").encode('utf-8'))
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        latencies.setdefault(request["op"], []).append(time.perf_counter() - start)
+        return response
+
+    for request_id in range(requests):
+        roll = rng.random()
+        if roll < 0.5:
+            item_type, title = rng.choice(titles)
+            query = title[:rng.randint(3, len(title))]
+            await call({"id": request_id, "op": "search", "query": query})
+        elif roll < 0.75 and len(borrowed) < 5:
+            item_type, title = rng.choice(titles)
+            response = await call({"id": request_id, "op": "borrow", "patron": patron, "type": item_type,
+                                   "title": title})
+            if response["ok"]:
+                borrowed.append((item_type, title))
+                # The desk reports serving the patron, which feeds the router's queue estimates
+                await call({"id": request_id, "op": "start", "ticket": response["desk"]["ticket"]})
+                await call({"id": request_id, "op": "complete", "ticket": response["desk"]["ticket"]})
+        elif borrowed:
+            item_type, title = borrowed.pop(rng.randrange(len(borrowed)))
+            await call({"id": request_id, "op": "return", "patron": patron, "type": item_type, "title": title})
+        else:
+            await call({"id": request_id, "op": "status", "patron": patron})
+    writer.close()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+async def run(host, port, connections, requests, titles):
+    latencies = {}
+    start = time.perf_counter()
+    await asyncio.gather(*(client(n, host, port, requests, titles, latencies, n) for n in range(connections)))
+    elapsed = time.perf_counter() - start
+    total = sum(len(values) for values in latencies.values())
+    print(f"{connections} connections, {total:,} requests in {elapsed:.2f}s: {total / elapsed:,.0f} req/s")
+    for op, values in sorted(latencies.items()) + [("all", [v for vs in latencies.values() for v in vs])]:
+        print(f"  {op:<8} n={len(values):<6} p50 {percentile(values, 0.5) * 1000:7.2f} ms  "
+              f"p99 {percentile(values, 0.99) * 1000:7.2f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load generator for circulation_server.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--connections", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200, help="requests per connection")
+    parser.add_argument("--spawn", action="store_true", help="start a server in a scratch directory first")
+    args = parser.parse_args()
+
+    with open(os.path.join(REPO_ROOT, 'staff_assignment.txt')) as file:
+        titles = [(item_type, title) for item_type, items in json.load(file).items() for title in items]
+
+    server, directory = None, None
+    if args.spawn:
+        directory = tempfile.mkdtemp()
+        shutil.copy(os.path.join(REPO_ROOT, 'staff_assignment.txt'), directory)
+        server = subprocess.Popen([sys.executable, os.path.join(REPO_ROOT, 'circulation_server.py'),
+                                   str(args.port), args.host], cwd=directory, stdout=subprocess.PIPE, text=True)
+        server.stdout.readline()  # Wait for "listening"
+    try:
+        asyncio.run(run(args.host, args.port, args.connections, args.requests, titles))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+            shutil.rmtree(directory)
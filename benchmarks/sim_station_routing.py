@@ -0,0 +1,105 @@
+import argparse
+import heapq
+import json
+import math
+import os
+import random
+from collections import deque
+
+from station_router import StationRouter
+from benchmarks.generators import SyntheticCatalog
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# Builds a synthetic arrival trace: (arrival time, item_type, title, service draw). Titles are
+# picked with Zipf-like popularity so a few staff members get most of the traffic
+def make_trace(data, arrivals, rate, seed):
+    rng = random.Random(seed)
+    titles = [(item_type, title) for item_type, items in data.items() for title in items]
+    rng.shuffle(titles)
+    weights = [1 / (rank + 1) for rank in range(len(titles))]
+    picks = rng.choices(titles, weights, k=arrivals)
+    trace, now = [], 0.0
+    for item_type, title in picks:
+        now += rng.expovariate(rate)
+        trace.append((now, item_type, title, rng.random()))
+    return trace
+
+
+# Replays a trace through a StationRouter on a virtual clock. Each staff member serves their own
+# queue first come, first served; service times are exponential with a per-staff mean. Returns
+# the wait of every checkout and how many were sent away from their assigned staff member
+def simulate(data, trace, service_means, rebalance):
+    clock = VirtualClock()
+    router = StationRouter(source=SyntheticCatalog(data), clock=clock)
+    waiting = {staff: deque() for staff in service_means}  # Tickets queued behind the one in service
+    busy = {staff: False for staff in service_means}
+    events = [(arrival, 0, index) for index, arrival in enumerate(entry[0] for entry in trace)]
+    heapq.heapify(events)
+    waits, rerouted, sequence = [], 0, len(trace)
+
+    def begin(ticket, draw):
+        nonlocal sequence
+        router.start(ticket)
+        busy[ticket.staff] = True
+        waits.append(clock.now - ticket.queued_at)
+        service = -service_means[ticket.staff] * math.log(1.0 - draw)
+        sequence += 1
+        heapq.heappush(events, (clock.now + service, 1, sequence, ticket))
+
+    while events:
+        event = heapq.heappop(events)
+        clock.now = event[0]
+        if event[1] == 0:
+            _, item_type, title, draw = trace[event[2]]
+            ticket = router.route(item_type, title, rebalance=rebalance)
+            rerouted += ticket.rerouted
+            if busy[ticket.staff]:
+                waiting[ticket.staff].append((ticket, draw))
+            else:
+                begin(ticket, draw)
+        else:
+            ticket = event[3]
+            router.complete(ticket)
+            busy[ticket.staff] = False
+            if waiting[ticket.staff]:
+                begin(*waiting[ticket.staff].popleft())
+    return waits, rerouted
+
+
+def summarize(waits):
+    waits = sorted(waits)
+    return sum(waits) / len(waits), waits[int(len(waits) * 0.95)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare static and load-balanced checkout routing")
+    parser.add_argument("--arrivals", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with open(os.path.join(REPO_ROOT, 'staff_assignment.txt')) as file:
+        data = json.load(file)
+    staff = sorted({details["staff"] for items in data.values() for details in items.values()})
+    rng = random.Random(args.seed)
+    service_means = {name: rng.uniform(60, 120) for name in staff}  # Seconds per checkout
+    capacity = sum(1 / mean for mean in service_means.values())  # Checkouts per second, all desks busy
+
+    print(f"{len(staff)} staff, {args.arrivals:,} checkouts per run; wait in seconds")
+    print(f"{'load':>5}  {'static mean':>11} {'p95':>8}  {'routed mean':>11} {'p95':>8}  rerouted")
+    for load in (0.3, 0.5, 0.7, 0.85):
+        trace = make_trace(data, args.arrivals, load * capacity, args.seed)
+        static_mean, static_p95 = summarize(simulate(data, trace, service_means, rebalance=False)[0])
+        waits, rerouted = simulate(data, trace, service_means, rebalance=True)
+        routed_mean, routed_p95 = summarize(waits)
+        print(f"{load:>5.0%}  {static_mean:>11.1f} {static_p95:>8.1f}  {routed_mean:>11.1f} {routed_p95:>8.1f}"
+              f"  {rerouted / len(trace):7.1%}")
@@ -0,0 +1,109 @@
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INITIAL_ITEM_COUNT = 1_000_000  # High enough that decrements never clamp at zero
+PATRONS_PER_WORKER = 3
+
+
+# One checkout terminal: random borrows/returns through the real Patron/LibraryItem code paths
+def worker(worker_id, directory, operations, seed):
+    os.chdir(directory)
+    sys.stdout = open(os.devnull, 'w')  # Patron/LibraryItem print every step
+    from library_item import LibraryItem
+    from patron import Patron
+
+    LibraryItem.item_count_write_through = True  # Persist every change to maximise contention
+    LibraryItem.initialize_item_count()
+    rng = random.Random(seed)
+    titles = [(item_type, title) for item_type, items in LibraryItem.get_all_items().items() for title in items]
+    patrons = [Patron.load_patron_data(f"Worker {worker_id} Patron {n}") for n in range(PATRONS_PER_WORKER)]
+    net_checkouts = 0
+
+    for _ in range(operations):
+        patron = rng.choice(patrons)
+        before = len(patron.checked_out_items)
+        if patron.checked_out_items and (rng.random() < 0.5 or before >= patron.item_limit):
+            patron.return_item(rng.choice(list(patron.checked_out_items)))
+        else:
+            item_type, title = rng.choice(titles)
+            patron.borrow_item(LibraryItem.from_catalog(item_type, title))
+        net_checkouts += len(patron.checked_out_items) - before
+        patron.save_patron_data()
+
+    LibraryItem.flush_item_count()
+    loans = {patron._Patron__name: [(item._item_type, item._title) for item in patron.checked_out_items]
+             for patron in patrons}
+    return loans, net_checkouts
+
+
+def verify(directory, results):
+    sys.path.insert(0, REPO_ROOT)
+    from borrowing_ledger import BorrowingLedger
+    from patron_store import PatronStore
+
+    expected_loans = {}
+    net_checkouts = 0
+    for loans, net in results:
+        net_checkouts += net
+        for name, items in loans.items():
+            for item_type, title in items:
+                expected_loans.setdefault(item_type, set()).add((name, title))
+
+    problems = []
+    with open(os.path.join(directory, 'item_count.json')) as file:
+        item_count = json.load(file)
+    if item_count != INITIAL_ITEM_COUNT - net_checkouts:
+        problems.append(f"item count {item_count}, expected {INITIAL_ITEM_COUNT - net_checkouts}")
+
+    for item_type in ("Book", "Magazine", "DVD"):
+        ledger = BorrowingLedger(item_type, os.path.join(directory, f'borrowing_ledger_{item_type.lower()}.log'))
+        ledger.load()
+        actual = set(ledger.open_loans)
+        expected = expected_loans.get(item_type, set())
+        if actual != expected:
+            problems.append(f"{item_type} ledger: {len(expected - actual)} loans lost, "
+                            f"{len(actual - expected)} unexpected")
+
+    store = PatronStore(os.path.join(directory, 'patrons.db'), legacy_filename=None)
+    for loans, _ in results:
+        for name, items in loans.items():
+            saved = [(item["type"], item["title"]) for item in store.load(name) or []]
+            if saved != items:
+                problems.append(f"patron record for {name} does not match")
+    if store.count() != len(results) * PATRONS_PER_WORKER:
+        problems.append(f"patron count {store.count()}, expected {len(results) * PATRONS_PER_WORKER}")
+    return problems, net_checkouts
+
+
+if __name__ == '__main__':
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    directory = tempfile.mkdtemp()
+    try:
+        shutil.copy(os.path.join(REPO_ROOT, 'staff_assignment.txt'), directory)
+        with open(os.path.join(directory, 'item_count.json'), 'w') as file:
+            json.dump(INITIAL_ITEM_COUNT, file)
+
+        context = multiprocessing.get_context('spawn')
+        start = time.perf_counter()
+        with context.Pool(workers) as pool:
+            results = pool.starmap(worker, [(n, directory, operations, n) for n in range(workers)])
+        elapsed = time.perf_counter() - start
+
+        problems, net_checkouts = verify(directory, results)
+        print(f"{workers} workers x {operations} operations in {elapsed:.1f}s "
+              f"({workers * operations / elapsed:,.0f} ops/s), {net_checkouts} loans open at the end")
+        for problem in problems:
+            print(f"FAIL: {problem}")
+        print("OK: no loans or count updates lost" if not problems else f"{len(problems)} problems")
+        sys.exit(1 if problems else 0)
+    finally:
+        shutil.rmtree(directory)
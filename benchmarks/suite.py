@@ -0,0 +1,195 @@
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.generators import (make_catalog, make_patrons, make_loans, misspell, write_catalog, write_ledgers,
+                                   write_patron_store)
+
+# Standard workloads run through the real code paths against a generated library, one size per
+# fresh subprocess (the catalog, ledgers and patron store are process-wide singletons).
+#   python -m benchmarks.suite --sizes 1000,10000,100000 --output results.json
+#   python -m benchmarks.suite --baseline old.json   # flag workloads that got slower
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SUITE_VERSION = 1
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+REGRESSION_THRESHOLD = 0.10  # Report workloads whose throughput dropped by more than this
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    total = sum(timings)
+    return {
+        "ops": len(timings),
+        "seconds": round(total, 6),
+        "ops_per_sec": round(len(timings) / total, 1) if total else None,
+        "p50_ms": round(timings[len(timings) // 2] * 1000, 4),
+        "p99_ms": round(timings[min(int(len(timings) * 0.99), len(timings) - 1)] * 1000, 4),
+    }
+
+
+def timed_each(func, arguments):
+    timings = []
+    for argument in arguments:
+        start = time.perf_counter()
+        func(argument)
+        timings.append(time.perf_counter() - start)
+    return summarize(timings)
+
+
+def timed_once(func):
+    start = time.perf_counter()
+    func()
+    return round(time.perf_counter() - start, 6)
+
+
+# Generates a library of size catalog items in the current directory and runs every workload on it
+def run_workloads(size, seed, operations):
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    data = make_catalog(size, seed, word_titles=True)
+    patrons = make_patrons(max(size // 10, 10), seed)
+    loans = make_loans(data, patrons, size // 5, seed)
+    write_catalog(data)
+    write_ledgers(loans)
+    write_patron_store(data, patrons, loans)
+    results = {"items": size, "patrons": len(patrons), "open_loans": len(loans),
+               "generate_seconds": round(time.perf_counter() - start, 3)}
+    titles = [(item_type, title) for item_type, items in data.items() for title in items]
+    del data
+
+    # Imported only now, so the modules pick up the generated files in this directory
+    import main
+    from availability import availability
+    from catalog_browser import catalog_browser
+    from library_item import LibraryItem
+    from patron import Patron
+    from staff_assignment import catalog
+    from title_search import title_search
+
+    devnull = open(os.devnull, 'w')
+    results["catalog_load_seconds"] = timed_once(catalog.get)
+    results["availability_build_seconds"] = timed_once(availability.rebuild)
+
+    def item_count_updates():
+        for _ in range(operations * 5):
+            LibraryItem.decrement_item_count()
+            LibraryItem.increment_item_count()
+        LibraryItem.flush_item_count()
+    results["item_count_init_seconds"] = timed_once(LibraryItem.initialize_item_count)
+    start = time.perf_counter()
+    item_count_updates()
+    results["item_count_updates"] = {"ops": operations * 10,
+                                     "ops_per_sec": round(operations * 10 / (time.perf_counter() - start), 1)}
+
+    results["search_index_build_seconds"] = timed_once(title_search.rebuild)
+    sample = rng.sample(titles, min(operations, len(titles)))
+    queries = [title.split(" ")[0][:4] for _, title in sample[::2]]
+    queries += [misspell(title, rng) if len(title) > 4 else title for _, title in sample[1::2]]
+    results["search"] = timed_each(lambda query: title_search.search(query, 10), queries)
+
+    def login_save(name):
+        patron = Patron.load_patron_data(name)
+        patron.save_patron_data()
+    with contextlib.redirect_stdout(devnull):
+        results["patron_login_save"] = timed_each(login_save, rng.sample(patrons, min(operations, len(patrons))))
+
+    results["catalog_browse_build_seconds"] = timed_once(catalog_browser.rebuild)
+    results["catalog_page"] = timed_each(lambda key: catalog_browser.page_after(key, 20),
+                                         [rng.choice(titles) for _ in range(operations)])
+
+    def borrow_or_return(name):
+        patron = Patron.load_patron_data(name)
+        if patron.checked_out_items and (rng.random() < 0.5 or len(patron.checked_out_items) >= patron.item_limit):
+            held = rng.choice(list(patron.checked_out_items))
+            patron.return_item(LibraryItem.from_catalog(held._item_type, held._title))
+        else:
+            item_type, title = rng.choice(titles)
+            patron.borrow_item(LibraryItem.from_catalog(item_type, title))
+        patron.save_patron_data()
+    with contextlib.redirect_stdout(devnull):
+        results["borrow_return_mix"] = timed_each(borrow_or_return, [rng.choice(patrons) for _ in range(operations)])
+        results["catalog_display"] = timed_each(lambda _: main.display_all_items(), range(3))
+    LibraryItem.flush_item_count()
+    devnull.close()
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_size(size, seed, operations):
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, PYTHONPATH=REPO_ROOT, LIBRARY_METRICS="0")
+        completed = subprocess.run([sys.executable, "-m", "benchmarks.suite", "--worker", str(size),
+                                    "--seed", str(seed), "--operations", str(operations)],
+                                   cwd=directory, env=env, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(f"size {size} failed:\n{completed.stderr}")
+        return json.loads(completed.stdout)
+
+
+# Yields (size, workload, old ops/s, new ops/s) for workloads slower than the baseline
+def regressions(baseline, report, threshold=REGRESSION_THRESHOLD):
+    for size, workloads in report["results"].items():
+        for workload, figures in workloads.items():
+            old = baseline.get("results", {}).get(size, {}).get(workload)
+            if isinstance(figures, dict) and isinstance(old, dict) and old.get("ops_per_sec") and figures.get("ops_per_sec"):
+                if figures["ops_per_sec"] < old["ops_per_sec"] * (1 - threshold):
+                    yield size, workload, old["ops_per_sec"], figures["ops_per_sec"]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Library benchmark suite")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="comma-separated catalog sizes, e.g. 1000,10000,1000000")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--operations", type=int, default=1000, help="operations per timed workload")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        json.dump(run_workloads(args.worker, args.seed, args.operations), sys.stdout)
+        sys.exit(0)
+
+    report = {
+        "suite_version": SUITE_VERSION,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "operations": args.operations,
+        "results": {},
+    }
+    for size in (int(size) for size in args.sizes.split(",")):
+        print(f"running {size:,} items...", file=sys.stderr)
+        report["results"][str(size)] = run_size(size, args.seed, args.operations)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as file:
+            slower = list(regressions(json.load(file), report))
+        for size, workload, old, new in slower:
+            print(f"REGRESSION {workload} at {int(size):,} items: {old:,.0f} -> {new:,.0f} ops/s", file=sys.stderr)
+        if slower:
+            sys.exit(1)
@@ -1,36 +1,38 @@
-def append_borrowing_data(patron_name, item_title, date_borrowed, due_date, item_type):
-    filename = f'borrowing_data_{item_type.lower()}.txt'
-    with open(filename, 'a') as file:
-        file.write(f"Patron Name: {patron_name}, Item Title: {item_title}, Date Borrowed: {date_borrowed}, Due Date: {due_date}\n")
-    
-    # Automatically sort after adding a new entry
-    sort_borrowing_data(item_type)
+import datetime
+from borrowing_ledger import get_ledger, format_legacy_line
+from file_utils import atomic_write_text
+from loan_records import write_loan_file
+from instrumentation import timed
 
 
-def delete_borrowing_data(patron_name, item_title, item_type):
-    filename = f'borrowing_data_{item_type.lower()}.txt'
-    with open(filename, 'r') as file:
-        lines = file.readlines()
+@timed("borrowing_data.append")
+def append_borrowing_data(patron_name, item_title, date_borrowed, due_date, item_type, copy_id="", copies=None):
+    # Append a borrow record to the ledger; no re-read or re-sort of existing loans. With copies, the
+    # ledger reserves the copy and returns its id (None if every copy is out)
+    return get_ledger(item_type).record_borrow(patron_name, item_title, date_borrowed, due_date, copy_id, copies)
 
-    with open(filename, 'w') as file:
-        for line in lines:
-            if not (f"Patron Name: {patron_name}, Item Title: {item_title}" in line):
-                file.write(line)
 
-    # Automatically sort after deleting an entry
-    sort_borrowing_data(item_type)
+@timed("borrowing_data.delete")
+def delete_borrowing_data(patron_name, item_title, item_type, date_returned=None):
+    # Append a return record; the open loan is dropped from the in-memory index. Returns False if
+    # the ledger had no open loan to close
+    if date_returned is None:
+        date_returned = datetime.date.today()
+    return get_ledger(item_type).record_return(patron_name, item_title, date_returned)
 
 
+@timed("borrowing_data.sort")
 def sort_borrowing_data(item_type):
     filename = f'borrowing_data_{item_type.lower()}.txt'
-    
-    # Step 1: Read and load each line from the file
-    with open(filename, 'r') as file:
-        lines = file.readlines()
 
-    # Step 2: Sort lines alphabetically by patron name
-    lines.sort(key=lambda line: line.split(",")[0].split(": ")[1].strip())
+    # Build the sorted-by-patron view from the ledger on demand
+    ledger = get_ledger(item_type)
+    loans = ledger.sorted_by_patron()
+
+    # Write it out in the human-readable format (temp file + rename, so readers never see half a file)
+    atomic_write_text(filename, "".join(format_legacy_line(*loan) for loan in loans))
 
-    # Step 3: Write the sorted lines back to the file
-    with open(filename, 'w') as file:
-        file.writelines(lines)
\ No newline at end of file
+    # And as a binary loan file that can be memory-mapped and searched by patron without parsing text
+    write_loan_file(f'borrowing_data_{item_type.lower()}.loans',
+                    (loan + (ledger.open_loans[(loan[0], loan[1])][2],) for loan in loans))
+    return loans
@@ -0,0 +1,432 @@
+import os
+import pickle
+import shutil
+import time
+from bisect import bisect_left, insort
+from file_lock import locked
+from instrumentation import timed, timer, count
+
+BORROW = "B"
+RETURN = "R"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_CHUNK = 10_000  # Loans per pickled chunk, so a snapshot can be streamed
+
+
+# Escapes the field separator so titles and names can hold any character
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def _unescape(value):
+    if "\\" not in value:
+        return value
+    out = []
+    chars = iter(value)
+    for char in chars:
+        if char == "\\":
+            char = next(chars, "")
+            out.append({"t": "\t", "n": "\n"}.get(char, char))
+        else:
+            out.append(char)
+    return "".join(out)
+
+
+# Splits one log record into its fields; returns None for blank or malformed lines
+def parse_record(line):
+    fields = [_unescape(field) for field in line.rstrip("\n").split("\t")]
+    kind = fields[0]
+    if (kind == BORROW and len(fields) >= 5) or (kind == RETURN and len(fields) >= 3):
+        return fields
+    return None
+
+
+# Parses one line of the legacy borrowing_data_<type>.txt format
+def parse_legacy_line(line):
+    line = line.rstrip("\n")
+    if not line.startswith("Patron Name: "):
+        return None
+    rest, _, due_date = line.rpartition(", Due Date: ")
+    rest, _, date_borrowed = rest.rpartition(", Date Borrowed: ")
+    patron, _, title = rest[len("Patron Name: "):].partition(", Item Title: ")
+    return patron, title, date_borrowed, due_date
+
+
+# Writes open loans, (patron_name, item_title, date_borrowed, due_date, copy_id) tuples, to a snapshot
+# file: a version header followed by pickled chunks. Replaced atomically (temp file + fsync + rename)
+def write_snapshot(filename, loans):
+    temp_filename = filename + '.tmp'
+    dates = {}  # Equal date strings share one object, which pickle then writes once per chunk
+    with open(temp_filename, 'wb') as file:
+        pickle.dump({"version": SNAPSHOT_VERSION}, file, pickle.HIGHEST_PROTOCOL)
+        chunk = []
+        for patron_name, item_title, date_borrowed, due_date, copy_id in loans:
+            chunk.append((patron_name, item_title, dates.setdefault(date_borrowed, date_borrowed),
+                          dates.setdefault(due_date, due_date), copy_id))
+            if len(chunk) >= SNAPSHOT_CHUNK:
+                pickle.dump(chunk, file, pickle.HIGHEST_PROTOCOL)
+                chunk = []
+        if chunk:
+            pickle.dump(chunk, file, pickle.HIGHEST_PROTOCOL)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_filename, filename)
+
+
+# Returns an iterator over the loans in a snapshot file (empty if there is no snapshot). The file
+# is opened straight away, so a later compaction can't swap it out from under the iterator
+def iter_snapshot(filename):
+    try:
+        file = open(filename, 'rb')
+    except FileNotFoundError:
+        return iter(())
+    return _read_snapshot(filename, file)
+
+
+def _read_snapshot(filename, file):
+    with file:
+        header = pickle.load(file)
+        if header.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"{filename}: unsupported snapshot version {header.get('version')!r}")
+        while True:
+            try:
+                chunk = pickle.load(file)
+            except EOFError:
+                return
+            yield from chunk
+
+
+# Formats one loan the way the legacy borrowing_data_<type>.txt files do
+def format_legacy_line(patron_name, item_title, date_borrowed, due_date):
+    return f"Patron Name: {patron_name}, Item Title: {item_title}, Date Borrowed: {date_borrowed}, Due Date: {due_date}\n"
+
+
+# Append-only log of borrow/return events for one item type, with an in-memory index of open loans.
+# Every operation holds the log's file lock and first reads any records other processes appended,
+# so several terminals can share one log without losing loans.
+# The log is a write-ahead log on top of a snapshot: compaction writes every open loan to the
+# snapshot file and starts an empty log, and loading reads the snapshot and replays the log. A
+# crash between the two steps is harmless, since replaying the old log over the new snapshot
+# gives the same open loans. So restart cost is bounded by the open loans plus at most
+# compaction_ratio log records per open loan
+class BorrowingLedger:
+    compaction_min_records = 1000  # Never compact logs smaller than this
+    compaction_ratio = 1  # Compact once the log holds this many records per open loan
+    durable = False  # fsync every record, so loans survive power loss as well as a crashed process
+    archive_directory = 'loan_history'  # Compacted logs are kept here as loan history; None discards them
+
+    def __init__(self, item_type, filename=None):
+        self.item_type = item_type
+        self.filename = filename or f'borrowing_ledger_{item_type.lower()}.log'
+        self.legacy_filename = f'borrowing_data_{item_type.lower()}.txt'
+        self.snapshot_filename = os.path.splitext(self.filename)[0] + '.snapshot'
+        self.open_loans = {}  # (patron_name, item_title) -> (date_borrowed, due_date, copy_id)
+        self.record_count = 0  # Records in the log file since the last snapshot
+        self._file = None  # Append handle on the current log file
+        self._inode = None  # Inode of the log file read so far; changes when the log is compacted
+        self._offset = 0  # Bytes of the log file already applied to open_loans
+        self._due_index = None  # Sorted [(due_date, patron_name, item_title, date_borrowed, copy_id)], built on first query
+        self._patron_index = None  # patron_name -> {item_title: None} in borrow order, built on first query
+        self._title_index = None  # item_title -> {patron_name: copy_id}, built on first copy reservation
+
+    # Brings the open-loan index up to date with the log file (importing the legacy text file on first use)
+    def load(self):
+        with locked(self.filename):
+            self._sync()
+
+    def _sync(self):
+        try:
+            stat = os.stat(self.filename)
+        except FileNotFoundError:
+            if self._inode is None:
+                if os.path.exists(self.snapshot_filename):
+                    self._load_snapshot()
+                    self._inode = 0  # Snapshot only; any log that appears later is replayed on top
+                elif os.path.exists(self.legacy_filename):
+                    self._import_legacy()
+            return
+
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            # First read, or another process compacted the log: load the snapshot and replay the log
+            self.close()
+            self._load_snapshot()
+            self._offset = 0
+            self._inode = stat.st_ino
+
+        if stat.st_size > self._offset:
+            with timer("ledger.read"):
+                with open(self.filename, 'rb') as file:
+                    file.seek(self._offset)
+                    data = file.read()
+                end = data.rfind(b"\n") + 1  # Ignore a trailing partial record
+                lines = data[:end].decode('utf-8').split("\n")[:-1]
+                for line in lines:
+                    self._apply(line)
+            self._offset += end
+            count("ledger.records_read", len(lines))
+
+    @timed("ledger.load_snapshot")
+    def _load_snapshot(self):
+        self.open_loans = {(patron_name, item_title): (date_borrowed, due_date, copy_id)
+                           for patron_name, item_title, date_borrowed, due_date, copy_id
+                           in iter_snapshot(self.snapshot_filename)}
+        self._due_index = None
+        self._patron_index = None
+        self._title_index = None
+        self.record_count = 0
+
+    def _import_legacy(self):
+        with open(self.legacy_filename, 'r', encoding='utf-8') as file:
+            for line in file:
+                loan = parse_legacy_line(line)
+                if loan:
+                    self._open_loan((loan[0], loan[1]), (loan[2], loan[3], ""))
+        self._compact()
+
+    # Applies one log record to the open-loan index
+    def _apply(self, line):
+        fields = parse_record(line)
+        if fields is None:
+            return
+        self.record_count += 1
+        key = (fields[1], fields[2])
+        if fields[0] == BORROW:
+            self._open_loan(key, (fields[3], fields[4], fields[5] if len(fields) > 5 else ""))
+        else:
+            self._close_loan(key)
+
+    # Every change to open_loans goes through these two so the due-date index stays in step
+    def _open_loan(self, key, loan):
+        self._close_loan(key)
+        self.open_loans[key] = loan
+        if self._due_index is not None:
+            insort(self._due_index, (loan[1], key[0], key[1], loan[0], loan[2]))
+        if self._patron_index is not None:
+            self._patron_index.setdefault(key[0], {})[key[1]] = None
+        if self._title_index is not None:
+            self._title_index.setdefault(key[1], {})[key[0]] = loan[2]
+
+    def _close_loan(self, key):
+        loan = self.open_loans.pop(key, None)
+        if loan is not None and self._due_index is not None:
+            entry = (loan[1], key[0], key[1], loan[0], loan[2])
+            position = bisect_left(self._due_index, entry)
+            if position < len(self._due_index) and self._due_index[position] == entry:
+                del self._due_index[position]
+        if loan is not None and self._patron_index is not None:
+            titles = self._patron_index.get(key[0], {})
+            titles.pop(key[1], None)
+            if not titles:
+                self._patron_index.pop(key[0], None)
+        if loan is not None and self._title_index is not None:
+            patrons = self._title_index.get(key[1], {})
+            patrons.pop(key[0], None)
+            if not patrons:
+                self._title_index.pop(key[1], None)
+
+    def _write(self, fields):
+        self._write_all([fields])
+
+    # Appends several records with a single write
+    @timed("ledger.write")
+    def _write_all(self, records):
+        if self._file is None:
+            self._file = open(self.filename, 'ab')
+            self._inode = os.fstat(self._file.fileno()).st_ino
+        data = "".join("\t".join(_escape(field) for field in fields) + "\n" for fields in records).encode('utf-8')
+        self._file.write(data)
+        self._file.flush()
+        if self.durable:
+            os.fsync(self._file.fileno())
+        self._offset += len(data)
+        self.record_count += len(records)
+
+    # Records a new loan of one copy of a title. Given copies (how many the title has), the copy is
+    # reserved here, under the log's lock and after reading every other terminal's records, so one
+    # copy is never lent twice: copy_id if it is free, otherwise the lowest free copy. Returns the
+    # copy id recorded, or None if every copy is on loan or the patron already has this title
+    def record_borrow(self, patron_name, item_title, date_borrowed, due_date, copy_id="", copies=None):
+        with locked(self.filename):
+            self._sync()
+            if copies is not None:
+                if (patron_name, item_title) in self.open_loans:
+                    return None
+                copy_id = self._free_copy(item_title, copies, copy_id)
+                if copy_id is None:
+                    return None
+            self._write((BORROW, patron_name, item_title, date_borrowed, due_date, copy_id))
+            self._open_loan((patron_name, item_title), (str(date_borrowed), str(due_date), str(copy_id)))
+            self._maybe_compact()
+            return copy_id
+
+    # Returns a copy (1..copies) of a title that no open loan holds, preferring preferred, or None.
+    # Loans recorded without a copy id still take up one copy each
+    def _free_copy(self, item_title, copies, preferred=""):
+        loaned = self._title_loans(item_title)
+        if len(loaned) >= copies:
+            return None
+        taken = set(loaned.values())
+        preferred = str(preferred)
+        if preferred.isdigit() and 1 <= int(preferred) <= copies and preferred not in taken:
+            return int(preferred)
+        for copy_id in range(1, copies + 1):
+            if str(copy_id) not in taken:
+                return copy_id
+        return None
+
+    # Returns {patron_name: copy_id} for the open loans of one title, from a per-title index
+    def _title_loans(self, item_title):
+        if self._title_index is None:
+            count("ledger.title_index_builds")
+            self._title_index = {}
+            for (patron_name, found_title), (_, _, copy_id) in self.open_loans.items():
+                self._title_index.setdefault(found_title, {})[patron_name] = copy_id
+        return self._title_index.get(item_title, {})
+
+    # Returns the copy ids of one title's open loans ("" for loans recorded without one)
+    def copies_on_loan(self, item_title):
+        self.load()
+        return list(self._title_loans(item_title).values())
+
+    # Records the return of a loan; returns False if there was no open loan to close
+    def record_return(self, patron_name, item_title, date_returned=""):
+        with locked(self.filename):
+            self._sync()
+            key = (patron_name, item_title)
+            if key not in self.open_loans:
+                return False
+            self._write((RETURN, patron_name, item_title, date_returned))
+            self._close_loan(key)
+            self._maybe_compact()
+            return True
+
+    # Records many returns under one lock and one write; returns the (patron_name, item_title) keys
+    # that had an open loan (the others are skipped, as in record_return)
+    def record_returns(self, loans, date_returned=""):
+        with locked(self.filename):
+            self._sync()
+            closed = []
+            for key in loans:
+                key = tuple(key)
+                if key in self.open_loans:
+                    self._close_loan(key)
+                    closed.append(key)
+            if closed:
+                self._write_all([(RETURN, patron_name, item_title, date_returned) for patron_name, item_title in closed])
+                self._maybe_compact()
+            return closed
+
+    # Returns (date_borrowed, due_date, copy_id) for an open loan, or None
+    def get_loan(self, patron_name, item_title):
+        self.load()
+        return self.open_loans.get((patron_name, item_title))
+
+    def _maybe_compact(self):
+        if (self.record_count >= self.compaction_min_records
+                and self.record_count >= self.compaction_ratio * len(self.open_loans)):
+            self._compact()
+
+    # Writes every open loan to the snapshot and starts an empty log
+    def compact(self):
+        with locked(self.filename):
+            self._sync()
+            self._compact()
+
+    @timed("ledger.compact")
+    def _compact(self):
+        self.close()
+        self._archive_log()
+        write_snapshot(self.snapshot_filename, ((patron_name, item_title, date_borrowed, due_date, copy_id)
+                                                for (patron_name, item_title), (date_borrowed, due_date, copy_id)
+                                                in self.open_loans.items()))
+        temp_filename = self.filename + '.tmp'
+        with open(temp_filename, 'wb') as file:
+            os.fsync(file.fileno())
+        os.replace(temp_filename, self.filename)
+        self._inode = os.stat(self.filename).st_ino
+        self._offset = 0
+        self.record_count = 0
+
+    # Returns open loans as (patron_name, item_title, date_borrowed, due_date), sorted by patron name
+    # and then title
+    def sorted_by_patron(self):
+        self.load()
+        loans = [(patron_name, item_title, date_borrowed, due_date)
+                 for (patron_name, item_title), (date_borrowed, due_date, _) in self.open_loans.items()]
+        with timer("ledger.sort"):
+            loans.sort(key=lambda loan: (loan[0], loan[1]))
+        return loans
+
+    # Keeps the log about to be compacted away as a history segment, <type>-<time>-<inode>.log in
+    # archive_directory. A hard link, so it costs nothing however long the log is; any records
+    # appended before the log is replaced land in the segment too. Keyed by inode, so a log that
+    # was archived by a compaction that crashed part-way isn't archived twice
+    def _archive_log(self):
+        if self.archive_directory is None:
+            return
+        try:
+            stat = os.stat(self.filename)
+        except FileNotFoundError:
+            return
+        if stat.st_size == 0:
+            return
+        os.makedirs(self.archive_directory, exist_ok=True)
+        prefix = f"{self.item_type.lower()}-"
+        suffix = f"-{stat.st_ino}.log"
+        if any(name.startswith(prefix) and name.endswith(suffix) for name in os.listdir(self.archive_directory)):
+            return
+        segment = os.path.join(self.archive_directory, f"{prefix}{time.time_ns()}{suffix}")
+        try:
+            os.link(self.filename, segment)
+        except OSError:  # No hard links on this file system
+            shutil.copyfile(self.filename, segment)
+
+    # Returns one patron's open loans as (item_title, date_borrowed, due_date, copy_id), in the order
+    # they were borrowed. Uses a per-patron index, so it doesn't scan every open loan
+    def loans_for(self, patron_name):
+        self.load()
+        return self._loans_for(patron_name)
+
+    # Returns {patron_name: loans_for(patron_name)} for several patrons, bringing the log up to date once
+    def loans_for_many(self, patron_names):
+        self.load()
+        return {patron_name: self._loans_for(patron_name) for patron_name in patron_names}
+
+    def _loans_for(self, patron_name):
+        if self._patron_index is None:
+            count("ledger.patron_index_builds")
+            self._patron_index = {}
+            for found_patron, item_title in self.open_loans:
+                self._patron_index.setdefault(found_patron, {})[item_title] = None
+        return [(item_title,) + self.open_loans[(patron_name, item_title)]
+                for item_title in self._patron_index.get(patron_name, ())]
+
+    # Returns open loans as (due_date, patron_name, item_title, date_borrowed, copy_id) with
+    # start <= due_date < end (ISO date strings; None leaves that side open), earliest due first.
+    # Uses a due-date-sorted index, so a query costs O(log n + k) rather than a scan of every loan
+    def loans_due_between(self, start=None, end=None):
+        self.load()
+        if self._due_index is None:
+            count("ledger.due_index_builds")
+            self._due_index = sorted((due_date, patron_name, item_title, date_borrowed, copy_id)
+                                     for (patron_name, item_title), (date_borrowed, due_date, copy_id)
+                                     in self.open_loans.items())
+        index = self._due_index
+        low = 0 if start is None else bisect_left(index, (str(start),))
+        high = len(index) if end is None else bisect_left(index, (str(end),))
+        return index[low:high]
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+_ledgers = {}
+
+
+# Returns the shared ledger for an item type
+def get_ledger(item_type):
+    key = item_type.lower()
+    if key not in _ledgers:
+        _ledgers[key] = BorrowingLedger(item_type)
+    return _ledgers[key]
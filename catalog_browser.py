@@ -0,0 +1,141 @@
+import heapq
+from bisect import bisect_left, insort
+from itertools import islice
+from staff_assignment import catalog
+from catalog_cache import CatalogListener, ReadOnlyView
+from catalog_index import catalog_index
+
+PAGE_SIZE = 20
+
+
+# Sort key for a title: case-insensitive, with the exact title breaking ties
+def title_key(title):
+    return (title.casefold(), title)
+
+
+# Pages through the catalog in a stable order (title, case-insensitive, then item type) without
+# building or printing the whole thing. Each item type keeps a precomputed sorted title list;
+# browsing all types merges those lists lazily. Cursors are the (item_type, title) of the last
+# item shown, so a page picks up in the right place even if titles were added or removed meanwhile
+class CatalogBrowser(CatalogListener):
+    insert_limit = 256  # Titles added since the last browse are inserted one by one up to this many, else merged
+
+    def __init__(self, source=catalog, index=catalog_index):
+        self.index = index  # Secondary indexes used to narrow field filters
+        self._titles = {}  # item_type -> titles sorted by title_key
+        self._unsorted = {}  # item_type -> titles added since the last browse, not yet in _titles
+        super().__init__(source)
+
+    # Rebuilds the sorted title lists from the catalog
+    def rebuild(self, all_items=None):
+        if all_items is None:
+            all_items = self.source.get()
+        self._titles = {item_type: sorted(items, key=title_key) for item_type, items in all_items.items()}
+        self._unsorted = {}
+        self._generation = self.source.generation
+
+    # Rebuilds after a reload, then files the titles added since the last browse into the sorted lists
+    def _ensure_current(self):
+        super()._ensure_current()
+        for item_type in list(self._unsorted):
+            self._sort_added(item_type)
+
+    # Adds one type's pending titles to its sorted list: one insort each for a few, one merge pass for
+    # a batch (e.g. a bulk import), so adding k titles costs O(n + k log k) rather than O(n * k)
+    def _sort_added(self, item_type):
+        added = self._unsorted.pop(item_type, None)
+        if not added:
+            return
+        titles = self._titles.setdefault(item_type, [])
+        if len(added) <= self.insert_limit:
+            for title in added:
+                insort(titles, title, key=title_key)
+        else:
+            titles[:] = heapq.merge(titles, sorted(added, key=title_key), key=title_key)
+
+    # Keeps the sorted lists in step with catalog edits. A new title is sorted in on the next browse
+    def add_item(self, item_type, title, details, previous=None):
+        if not self.built:
+            return  # Not built yet; the first browse builds from the full catalog
+        if previous is None:
+            self._unsorted.setdefault(item_type, []).append(title)
+
+    def remove_item(self, item_type, title, details):
+        if not self.built:
+            return
+        self._sort_added(item_type)
+        titles = self._titles.get(item_type, [])
+        position = bisect_left(titles, title_key(title), key=title_key)
+        if position < len(titles) and titles[position] == title:
+            del titles[position]
+
+    # Number of titles (of one type, or all)
+    def count(self, item_type=None):
+        self._ensure_current()
+        if item_type is not None:
+            return len(self._titles.get(item_type, ()))
+        return sum(len(titles) for titles in self._titles.values())
+
+    # Yields (item_type, title) for one type's titles ordered after cursor
+    def _type_keys(self, item_type, cursor):
+        titles = self._titles.get(item_type, [])
+        position = 0
+        if cursor is not None:
+            cursor_key = title_key(cursor[1])
+            position = bisect_left(titles, cursor_key, key=title_key)
+            if position < len(titles) and titles[position] == cursor[1] and item_type <= cursor[0]:
+                position += 1  # Same title as the cursor: it sorts after the cursor only for a later type
+        for i in range(position, len(titles)):
+            yield item_type, titles[i]
+
+    @staticmethod
+    def _order(key):
+        return title_key(key[1]) + (key[0],)
+
+    # Yields (item_type, title, details) in browse order, starting after cursor. filters are
+    # field=value pairs (e.g. author="George Orwell"); details are read-only views
+    def browse(self, item_type=None, cursor=None, **filters):
+        self._ensure_current()
+        all_items = self.source.get()
+        item_types = [item_type] if item_type is not None else list(self._titles)
+
+        indexed = [field for field in filters if field in self.index.fields]
+        if indexed:
+            # Narrow to the index matches for one filter and sort just those
+            field = indexed[0]
+            keys = sorted((key for key in self.index.find(field, filters[field], item_type)), key=self._order)
+            if cursor is not None:
+                keys = keys[bisect_left(keys, self._order(cursor), key=self._order):]
+                if keys and keys[0] == tuple(cursor):
+                    keys = keys[1:]
+        elif len(item_types) == 1:
+            keys = self._type_keys(item_types[0], cursor)
+        else:
+            keys = heapq.merge(*(self._type_keys(found_type, cursor) for found_type in item_types), key=self._order)
+
+        for found_type, title in keys:
+            details = all_items.get(found_type, {}).get(title)
+            if details is None:
+                continue
+            if all(details.get(field) == value for field, value in filters.items()):
+                yield found_type, title, ReadOnlyView(details)
+
+    # Returns up to size items after cursor, and the cursor for the next page (None on the last page)
+    def page_after(self, cursor=None, size=PAGE_SIZE, item_type=None, **filters):
+        items = list(islice(self.browse(item_type, cursor, **filters), size + 1))
+        next_cursor = (items[size - 1][0], items[size - 1][1]) if len(items) > size else None
+        return items[:size], next_cursor
+
+    # Returns page number (from 0) of size items. Use page_after to walk far into a big catalog:
+    # it seeks straight to the cursor instead of skipping over the earlier pages
+    def page(self, number=0, size=PAGE_SIZE, item_type=None, **filters):
+        if item_type is not None and not filters:
+            self._ensure_current()
+            all_items = self.source.get()[item_type]
+            titles = self._titles.get(item_type, [])[number * size:(number + 1) * size]
+            return [(item_type, title, ReadOnlyView(all_items[title])) for title in titles]
+        return list(islice(self.browse(item_type, **filters), number * size, (number + 1) * size))
+
+
+# Shared catalog browser
+catalog_browser = CatalogBrowser()
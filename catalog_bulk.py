@@ -0,0 +1,140 @@
+import json
+import os
+import sys
+from library_item import LibraryItem, ITEM_FIELDS, REQUIRED_FIELDS
+from staff_assignment import catalog
+from file_lock import locked
+
+
+# Outcome of a bulk import: how many records were applied and which lines were rejected
+class ImportResult:
+    def __init__(self):
+        self.imported = 0  # Records written to the catalog
+        self.added = 0  # Records whose title was new to the catalog
+        self.batches = 0
+        self.errors = []  # (line_number, message)
+
+    def __str__(self):
+        return (f"Imported {self.imported} records ({self.added} new) in {self.batches} batches, "
+                f"{len(self.errors)} rejected.")
+
+
+# Checks one import record against its item type's field set; returns an error message or None
+def validate_record(record):
+    if not isinstance(record, dict):
+        return "record is not a JSON object"
+    item_type = record.get("type")
+    if item_type not in ITEM_FIELDS:
+        return f"unknown item type {item_type!r}"
+    title = record.get("title")
+    if not isinstance(title, str) or not title.strip():
+        return "missing title"
+    fields = set(record) - {"type", "title"}
+    unknown = fields - ITEM_FIELDS[item_type]
+    if unknown:
+        return f"unknown {item_type} fields: {', '.join(sorted(unknown))}"
+    missing = REQUIRED_FIELDS - fields
+    if missing:
+        return f"missing fields: {', '.join(sorted(missing))}"
+    copies = record.get("copies", 1)
+    if not isinstance(copies, int) or isinstance(copies, bool) or copies < 0:
+        return f"copies must be a non-negative integer, not {copies!r}"
+    return None
+
+
+# Yields (line_number, record) from a JSON Lines file one line at a time
+def iter_jsonl(filename):
+    with open(filename, 'r', encoding='utf-8') as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as error:
+                yield line_number, error
+
+
+# Streams a JSON Lines catalog into the library in batches. Each line looks like
+# {"type": "Book", "title": "1984", "staff": "James Foley", "station": 1, "author": ...}
+def import_catalog(filename, batch_size=1000):
+    result = ImportResult()
+    batch = {item_type: [] for item_type in ITEM_FIELDS}
+    pending = 0
+
+    def flush():
+        for item_type, items in batch.items():
+            if items:
+                result.added += LibraryItem.add_items(item_type, items)
+                result.imported += len(items)
+                items.clear()
+        result.batches += 1
+
+    for line_number, record in iter_jsonl(filename):
+        if isinstance(record, json.JSONDecodeError):
+            result.errors.append((line_number, f"invalid JSON: {record.msg}"))
+            continue
+        error = validate_record(record)
+        if error:
+            result.errors.append((line_number, error))
+            continue
+        details = {field: value for field, value in record.items() if field not in ("type", "title")}
+        batch[record["type"]].append((record["title"].strip(), details))
+        pending += 1
+        if pending >= batch_size:
+            flush()
+            pending = 0
+    if pending:
+        flush()
+    return result
+
+
+# Yields the catalog as JSON Lines records, one item at a time
+def iter_catalog_records(item_types=None):
+    for item_type, items in catalog.get().items():
+        if item_types and item_type not in item_types:
+            continue
+        for title, details in items.items():
+            yield dict({"type": item_type, "title": title}, **details)
+
+
+# Streams the catalog to a JSON Lines file; returns the number of records written
+def export_catalog(filename, item_types=None):
+    count = 0
+    temp_filename = filename + '.tmp'
+    with open(temp_filename, 'w', encoding='utf-8') as file:
+        for record in iter_catalog_records(item_types):
+            file.write(json.dumps(record) + "\n")
+            count += 1
+    os.replace(temp_filename, filename)
+    return count
+
+
+# Writes the catalog back out in the staff_assignment.txt layout, one record at a time
+def write_catalog_file(filename='staff_assignment.txt'):
+    temp_filename = filename + '.tmp'
+    with locked(filename):
+        with open(temp_filename, 'w', encoding='utf-8') as file:
+            file.write("{")
+            for type_number, (item_type, items) in enumerate(catalog.get().items()):
+                file.write(("," if type_number else "") + f"\n    {json.dumps(item_type)}: {{")
+                for item_number, (title, details) in enumerate(items.items()):
+                    file.write(("," if item_number else "") + f"\n        {json.dumps(title)}: {json.dumps(details)}")
+                file.write("\n    }")
+            file.write("\n}\n")
+        os.replace(temp_filename, filename)
+
+
+if __name__ == '__main__':
+    # Usage: python catalog_bulk.py import <catalog.jsonl> | export <catalog.jsonl>
+    if len(sys.argv) != 3 or sys.argv[1] not in ("import", "export"):
+        print("Usage: python catalog_bulk.py import|export <catalog.jsonl>")
+        sys.exit(2)
+    LibraryItem.initialize_item_count()
+    if sys.argv[1] == "import":
+        result = import_catalog(sys.argv[2])
+        for line_number, message in result.errors:
+            print(f"Line {line_number}: {message}")
+        print(result)
+        write_catalog_file(catalog.filename)
+    else:
+        print(f"Exported {export_catalog(sys.argv[2])} records to {sys.argv[2]}.")
@@ -0,0 +1,204 @@
+import json
+import os
+import time
+from collections.abc import Mapping, MutableMapping
+from instrumentation import timer
+
+
+# Keeps a parsed copy of the catalog file in memory and only re-parses it
+# when the file's modification time or size changes on disk
+class CatalogCache:
+    def __init__(self, filename, check_interval=0.0):
+        self.filename = filename  # Catalog file to load (e.g. staff_assignment.txt)
+        self.check_interval = check_interval  # Seconds between freshness checks (0 = check every access)
+        self.data = {}  # Parsed catalog, updated in place so references to it stay valid
+        self.generation = 0  # Bumped on every (re)load so dependents can tell the data changed
+        self.hits = 0  # Accesses served from memory
+        self.misses = 0  # First load of the file
+        self.reloads = 0  # Re-parses caused by the file changing on disk
+        self._signature = None  # (mtime, size) of the file when it was last parsed
+        self._last_check = 0.0
+        self._listeners = []  # Structures derived from the catalog (CatalogListener), told about every edit
+
+    # Returns the (mtime, size) signature of the catalog file, or None if it is missing
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.filename)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    # Parses the catalog file and replaces the cached contents in place
+    def _load(self, signature):
+        with timer("catalog.load"), open(self.filename, 'r') as file:
+            data = json.load(file)
+        self.data.clear()
+        self.data.update(data)
+        self._signature = signature
+        self.generation += 1
+
+    # Returns the cached catalog, re-reading the file only if it changed since the last load
+    def get(self):
+        if self._signature is not None and self.check_interval:
+            now = time.monotonic()
+            if now - self._last_check < self.check_interval:
+                self.hits += 1
+                return self.data
+            self._last_check = now
+
+        signature = self._file_signature()
+        if self._signature is not None and (signature is None or signature == self._signature):
+            # Unchanged (or temporarily missing) file: keep serving what we already have
+            self.hits += 1
+            return self.data
+
+        if signature is None:
+            raise FileNotFoundError(f"Catalog file '{self.filename}' not found.")
+
+        if self._signature is None:
+            self.misses += 1
+        else:
+            self.reloads += 1
+        self._load(signature)
+        self._last_check = time.monotonic()
+        return self.data
+
+    # Registers a structure derived from the catalog, to be told about every edit
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    # Adds or replaces one record in the cached catalog and passes the edit on to every listener.
+    # Returns the record it replaced, or None
+    def set_item(self, item_type, title, details):
+        items = self.get()[item_type]
+        previous = items.get(title)
+        items[title] = details
+        for listener in self._listeners:
+            listener.add_item(item_type, title, details, previous)
+        return previous
+
+    # Adds or replaces many records of one type and passes them on to every listener as one batch.
+    # Returns [(title, details, previous record or None)]
+    def set_items(self, item_type, records):
+        items = self.get()[item_type]
+        edits = []
+        for title, details in records:
+            edits.append((title, details, items.get(title)))
+            items[title] = details
+        for listener in self._listeners:
+            listener.add_items(item_type, edits)
+        return edits
+
+    # Removes one record from the cached catalog and passes the edit on to every listener. Returns
+    # the removed record
+    def pop_item(self, item_type, title):
+        details = self.get()[item_type].pop(title)
+        for listener in self._listeners:
+            listener.remove_item(item_type, title, details)
+        return details
+
+    # Forces the next access to re-check the file on disk
+    def invalidate(self):
+        self._last_check = 0.0
+
+    # Returns the cache counters so callers can confirm lookups stay in memory
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "generation": self.generation,
+        }
+
+
+# Base for in-memory structures derived from a catalog cache (indexes, lookup tables). It registers
+# with the cache, which passes on every edit through add_item(item_type, title, details, previous),
+# add_items(item_type, [(title, details, previous)]) for a batch, and remove_item(item_type, title,
+# details), and is rebuilt from the whole catalog by rebuild() on first use and whenever the catalog
+# was reloaded from disk. Edits that arrive before the first build can be ignored, since that build
+# reads everything
+class CatalogListener:
+    def __init__(self, source):
+        self.source = source  # Catalog cache (anything with get(), generation and add_listener())
+        self._generation = None  # Catalog generation of the last rebuild; rebuild() sets it
+        source.add_listener(self)
+
+    # True once built from the catalog
+    @property
+    def built(self):
+        return self._generation is not None
+
+    # Rebuilds if the catalog was (re)loaded from disk since the last build
+    def _ensure_current(self):
+        self.source.get()
+        if self._generation != self.source.generation:
+            self.rebuild()
+
+    def rebuild(self, all_items=None):
+        raise NotImplementedError
+
+    def add_item(self, item_type, title, details, previous=None):
+        pass
+
+    def add_items(self, item_type, edits):
+        for title, details, previous in edits:
+            self.add_item(item_type, title, details, previous)
+
+    def remove_item(self, item_type, title, details):
+        pass
+
+
+# Dict-like view of a CatalogCache that parses the catalog file on first access instead of at import
+class LazyCatalog(MutableMapping):
+    def __init__(self, cache):
+        self._cache = cache
+
+    def __getitem__(self, item_type):
+        return self._cache.get()[item_type]
+
+    def __setitem__(self, item_type, items):
+        self._cache.get()[item_type] = items
+
+    def __delitem__(self, item_type):
+        del self._cache.get()[item_type]
+
+    def __iter__(self):
+        return iter(self._cache.get())
+
+    def __len__(self):
+        return len(self._cache.get())
+
+    def __repr__(self):
+        if self._cache.generation == 0:
+            return f"<LazyCatalog '{self._cache.filename}' (not loaded)>"
+        return repr(self._cache.data)
+
+    # True once the catalog file has been parsed
+    @property
+    def loaded(self):
+        return self._cache.generation > 0
+
+
+# Read-only view of the nested catalog dicts. Mappings at every level are wrapped as they are
+# reached, so callers can read the shared catalog but can't change it through the view
+class ReadOnlyView(Mapping):
+    __slots__ = ('_data',)
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getitem__(self, key):
+        value = self._data[key]
+        return ReadOnlyView(value) if isinstance(value, dict) else value
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __repr__(self):
+        return f"ReadOnlyView({self._data!r})"
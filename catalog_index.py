@@ -0,0 +1,106 @@
+from staff_assignment import catalog
+from catalog_cache import CatalogListener
+from instrumentation import timed
+
+# Catalog fields that get a secondary hash index
+INDEXED_FIELDS = ("author", "genre", "director", "ISBN", "shelf_location", "staff", "station")
+
+
+# Secondary hash indexes over the catalog records (field value -> items with that value)
+class CatalogIndex(CatalogListener):
+    def __init__(self, fields=INDEXED_FIELDS, source=catalog):
+        self.fields = tuple(fields)
+        # field -> value -> {(item_type, title): None}; dicts keep insertion order and give O(1) removal
+        self._indexes = {field: {} for field in self.fields}
+        super().__init__(source)
+
+    # Rebuilds every index from the current catalog contents
+    def rebuild(self, all_items=None):
+        if all_items is None:
+            all_items = self.source.get()
+        self._indexes = {field: {} for field in self.fields}
+        for item_type, items in all_items.items():
+            for title, details in items.items():
+                self._add(item_type, title, details)
+        self._generation = self.source.generation
+
+    def _add(self, item_type, title, details):
+        key = (item_type, title)
+        for field in self.fields:
+            if field in details:
+                self._indexes[field].setdefault(details[field], {})[key] = None
+
+    def _remove(self, item_type, title, details):
+        key = (item_type, title)
+        for field in self.fields:
+            if field not in details:
+                continue
+            bucket = self._indexes[field].get(details[field])
+            if bucket is not None:
+                bucket.pop(key, None)
+                if not bucket:
+                    del self._indexes[field][details[field]]
+
+    # Indexes an item that was just added to the catalog (replacing any previous record)
+    def add_item(self, item_type, title, details, previous=None):
+        if not self.built:
+            return  # Not built yet; the first query builds from the full catalog
+        if previous is not None:
+            self._remove(item_type, title, previous)
+        self._add(item_type, title, details)
+
+    # Drops an item that was just removed from the catalog
+    def remove_item(self, item_type, title, details):
+        if not self.built:
+            return
+        self._remove(item_type, title, details)
+
+    # Returns [(item_type, title), ...] for every item whose field equals value
+    @timed("catalog_index.find")
+    def find(self, field, value, item_type=None):
+        if field not in self._indexes:
+            raise KeyError(f"Field '{field}' is not indexed.")
+        self._ensure_current()
+        matches = self._indexes[field].get(value, {})
+        if item_type is None:
+            return list(matches)
+        return [key for key in matches if key[0] == item_type]
+
+    # Returns the number of items whose field equals value without building a result list
+    def count(self, field, value):
+        if field not in self._indexes:
+            raise KeyError(f"Field '{field}' is not indexed.")
+        self._ensure_current()
+        return len(self._indexes[field].get(value, ()))
+
+    # Returns the distinct values currently indexed for a field
+    def values(self, field):
+        self._ensure_current()
+        return list(self._indexes[field])
+
+    def by_author(self, author):
+        return self.find("author", author)
+
+    def by_genre(self, genre, item_type=None):
+        return self.find("genre", genre, item_type)
+
+    def by_director(self, director):
+        return self.find("director", director)
+
+    def by_shelf(self, shelf_location):
+        return self.find("shelf_location", shelf_location)
+
+    def by_staff(self, staff):
+        return self.find("staff", staff)
+
+    def by_station(self, station):
+        return self.find("station", station)
+
+    # Returns the (item_type, title) with the given ISBN, or None
+    def by_isbn(self, isbn):
+        matches = self.find("ISBN", isbn)
+        return matches[0] if matches else None
+
+
+# Shared index over the library catalog
+catalog_index = CatalogIndex()
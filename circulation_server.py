@@ -0,0 +1,198 @@
+import asyncio
+import contextlib
+import io
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from patron import Patron
+from library_item import LibraryItem
+from staff_assignment import catalog
+from availability import availability
+from title_search import title_search
+from station_router import station_router
+from persistence import recover
+
+# String fields each op needs in a request (a search may also name a "type"; start and complete
+# take the integer "ticket" a borrow returned)
+REQUEST_FIELDS = {"search": ("query",), "borrow": ("patron", "type", "title"), "return": ("patron", "type", "title"),
+                  "status": ("patron",), "start": (), "complete": ()}
+
+
+# Circulation operations for many simultaneous clients. Every operation runs on one writer thread,
+# which keeps the Patron/LibraryItem updates in order and keeps disk reads (a reloaded catalog, the
+# borrowing ledgers) off the event loop. Patrons are loaded for each operation and not kept: the
+# store and the ledgers are shared with CLI terminals, so a kept Patron would go stale.
+# A borrow answers with a desk ticket from the station router; the desk's client reports "start"
+# when the patron reaches it and "complete" when the checkout is done, which is what lets the
+# router send later checkouts to the least busy desk
+class CirculationService:
+    def __init__(self):
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="circulation-writer")
+
+    # Runs a blocking operation on the writer thread and returns (result, printed output)
+    async def _on_writer(self, func, *args):
+        def call():
+            with contextlib.redirect_stdout(io.StringIO()) as output:
+                result = func(*args)
+            return result, output.getvalue().strip()
+        return await asyncio.get_running_loop().run_in_executor(self._writer, call)
+
+    # Returns (checked-out items, item limit) to report for a patron
+    @staticmethod
+    def _describe(patron):
+        return [{"type": item._item_type, "title": item._title, "copy_id": item.copy_id}
+                for item in patron.checked_out_items], patron.item_limit
+
+    # Returns the matches for a query, with copies other terminals lent or took back since our last look
+    def _search(self, query, limit, item_type):
+        staff_assignment = catalog.get()
+        results = []
+        for found_type, title in title_search.search(query, limit, item_type):
+            details = staff_assignment[found_type][title]
+            availability.refresh_title(found_type, title)
+            results.append({"type": found_type, "title": title, "staff": details.get("staff"),
+                            "station": details.get("station"),
+                            "available_copies": availability.available_copies(found_type, title)})
+        return results
+
+    async def search(self, request):
+        results, _ = await self._on_writer(self._search, request["query"], request.get("limit", 10),
+                                           request.get("type"))
+        return {"ok": True, "results": results}
+
+    # Returns None if the title is not in the catalog
+    def _borrow(self, name, item_type, title):
+        if title not in catalog.get().get(item_type, {}):
+            return None
+        patron = Patron.load_patron_data(name)
+        ticket = patron.borrow_item(LibraryItem.from_catalog(item_type, title))
+        if ticket is None:
+            return False, self._describe(patron), None
+        patron.save_patron_data()
+        desk = {"ticket": ticket.id, "staff": ticket.staff, "station": ticket.station,
+                "estimated_wait": round(ticket.estimated_wait, 1)}
+        return True, self._describe(patron), desk
+
+    # Returns None if the title is not in the catalog
+    def _return(self, name, item_type, title):
+        if title not in catalog.get().get(item_type, {}):
+            return None
+        patron = Patron.load_patron_data(name)
+        before = len(patron.checked_out_items)
+        patron.return_item(LibraryItem.from_catalog(item_type, title))
+        returned = len(patron.checked_out_items) < before
+        if returned:
+            patron.save_patron_data()
+        return returned, self._describe(patron), None
+
+    def _status(self, name):
+        return True, self._describe(Patron.load_patron_data(name)), None
+
+    # Records that a desk started or finished serving a ticket
+    @staticmethod
+    def _report(op, ticket_id):
+        ticket = station_router.find(ticket_id)
+        if ticket is None:
+            return {"ok": False, "error": f"No open ticket {ticket_id}."}
+        if op == "start":
+            station_router.start(ticket)
+        else:
+            station_router.complete(ticket)
+        return {"ok": True, "staff": ticket.staff, "station": ticket.station}
+
+    # Returns an error message for a request whose fields have the wrong type, or None
+    @staticmethod
+    def _invalid(request):
+        if not isinstance(request, dict):
+            return "Bad request: expected a JSON object."
+        for field in REQUEST_FIELDS.get(request.get("op"), ()):
+            if not isinstance(request.get(field), str):
+                return f"Bad request: {field!r} must be a string."
+        if request.get("type") is not None and not isinstance(request["type"], str):
+            return "Bad request: 'type' must be a string."
+        if request.get("op") in ("start", "complete"):
+            ticket = request.get("ticket")
+            if not isinstance(ticket, int) or isinstance(ticket, bool):
+                return "Bad request: 'ticket' must be an integer."
+        limit = request.get("limit", 10)
+        if not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+            return "Bad request: 'limit' must be a positive integer."
+        return None
+
+    async def handle(self, request):
+        error = self._invalid(request)
+        if error:
+            return {"ok": False, "error": error}
+        op = request.get("op")
+        if op == "search":
+            return await self.search(request)
+        if op in ("start", "complete"):
+            response, _ = await self._on_writer(self._report, op, request["ticket"])
+            return response
+
+        if op in ("borrow", "return"):
+            item_type, title = request.get("type"), request.get("title")
+            func = self._borrow if op == "borrow" else self._return
+            result, message = await self._on_writer(func, request["patron"], item_type, title)
+            if result is None:
+                return {"ok": False, "error": f"No {item_type} titled {title!r} in the catalog."}
+        elif op == "status":
+            result, message = await self._on_writer(self._status, request["patron"])
+        else:
+            return {"ok": False, "error": f"Unknown op {op!r}."}
+        ok, (items, max_items), desk = result
+        response = {"ok": ok, "message": message, "checked_out": items, "max_items": max_items,
+                    "items_remaining": LibraryItem.total_items()}
+        if desk is not None:
+            response["desk"] = desk
+        return response
+
+    # Serves one client connection: one JSON request per line in, one JSON response per line out
+    async def serve_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    response = await self.handle(request)
+                except (ValueError, KeyError, TypeError) as error:
+                    request, response = {}, {"ok": False, "error": f"Bad request: {error}"}
+                if isinstance(request, dict) and "id" in request:
+                    response["id"] = request["id"]
+                writer.write((json.dumps(response) + "\n").encode('utf-8'))
+                await writer.drain()
+        except ConnectionResetError:
+            pass
+        finally:
+            writer.close()
+
+    def close(self):
+        self._writer.shutdown(wait=True)
+        LibraryItem.flush_item_count()
+
+
+async def serve(host='127.0.0.1', port=8765):
+    service = CirculationService()
+    recover()  # Load the snapshots and replay whatever the last session logged after them
+    station_router.reports_completions = True  # Desk clients report start/complete, so checkouts can be rebalanced
+    title_search.prefix("")  # Build the search index and availability table before taking traffic
+    availability.rebuild()
+    server = await asyncio.start_server(service.serve_client, host, port)
+    print(f"Circulation service listening on {host}:{port}", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    # Usage: python circulation_server.py [port] [host]
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    host = sys.argv[2] if len(sys.argv) > 2 else '127.0.0.1'
+    try:
+        asyncio.run(serve(host, port))
+    except KeyboardInterrupt:
+        pass
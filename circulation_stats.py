@@ -0,0 +1,379 @@
+import array
+import datetime
+import os
+import pickle
+import sys
+from collections import Counter
+from borrowing_ledger import get_ledger, _unescape, BORROW, RETURN
+from file_lock import locked
+from library_item import ITEM_FIELDS
+from staff_assignment import catalog
+from instrumentation import timed
+
+try:
+    import numpy
+except ImportError:  # Optional; without it the same statistics are computed in plain Python loops
+    numpy = None
+
+ITEM_TYPES = tuple(ITEM_FIELDS)
+EVENTS_VERSION = 1
+BORROWED, RETURNED = 0, 1  # Values of the kind column
+
+
+def _day(value, days):
+    day = days.get(value)
+    if day is None:
+        try:
+            day = datetime.date.fromisoformat(value).toordinal()
+        except ValueError:
+            day = 0  # Unknown date (returns recorded without one, hand-edited data)
+        days[value] = day
+    return day
+
+
+# Parses one ledger log into columns: per-event kind, patron code, title code and day (date
+# ordinal), with the patron and title strings each stored once
+def parse_log(filename):
+    patrons, titles, days = {}, {}, {}
+    columns = {"kind": array.array('b'), "patron": array.array('i'), "title": array.array('i'),
+               "day": array.array('i')}
+    with open(filename, 'rb') as file:
+        data = file.read()
+    data = data[:data.rfind(b"\n") + 1].decode('utf-8')  # Ignore a trailing partial record
+    kind, patron, title, day = columns["kind"], columns["patron"], columns["title"], columns["day"]
+    for line in data.split("\n")[:-1]:
+        fields = line.split("\t")
+        if "\\" in line:
+            fields = [_unescape(field) for field in fields]
+        if fields[0] == BORROW and len(fields) >= 5:
+            kind.append(BORROWED)
+        elif fields[0] == RETURN and len(fields) >= 3:
+            kind.append(RETURNED)
+        else:
+            continue
+        patron.append(patrons.setdefault(fields[1], len(patrons)))
+        title.append(titles.setdefault(fields[2], len(titles)))
+        day.append(_day(fields[3], days) if len(fields) > 3 else 0)
+    columns["patrons"] = list(patrons)
+    columns["titles"] = list(titles)
+    return columns
+
+
+# Columns for an archived history segment, parsed once and cached next to it as <segment>.events
+def load_segment(filename):
+    cache_filename = os.path.splitext(filename)[0] + '.events'
+    try:
+        with open(cache_filename, 'rb') as file:
+            cached = pickle.load(file)
+        if cached.get("version") == EVENTS_VERSION:
+            return {name: _from_bytes(value) if isinstance(value, tuple) else value
+                    for name, value in cached.items()}
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        pass
+    columns = parse_log(filename)
+    temp_filename = cache_filename + '.tmp'
+    with open(temp_filename, 'wb') as file:
+        pickle.dump(dict({name: (value.typecode, value.tobytes()) if isinstance(value, array.array) else value
+                          for name, value in columns.items()}, version=EVENTS_VERSION),
+                    file, pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_filename, cache_filename)
+    return columns
+
+
+def _from_bytes(value):
+    typecode, data = value
+    if numpy is not None:
+        return numpy.frombuffer(data, dtype=numpy.int8 if typecode == 'b' else numpy.intc)
+    column = array.array(typecode)
+    column.frombytes(data)
+    return column
+
+
+# Archived history segments for an item type, oldest first, and the live log parsed into columns
+# (or None). Read under the ledger lock, so a compaction can't move records between the two meanwhile
+def history_files(item_type):
+    ledger = get_ledger(item_type)
+    prefix = f"{item_type.lower()}-"
+    with locked(ledger.filename):
+        segments = []
+        if ledger.archive_directory and os.path.isdir(ledger.archive_directory):
+            segments = sorted((name for name in os.listdir(ledger.archive_directory)
+                               if name.startswith(prefix) and name.endswith(".log")),
+                              key=lambda name: int(name.split("-")[1]))
+            segments = [os.path.join(ledger.archive_directory, name) for name in segments]
+        live = ledger.filename if os.path.exists(ledger.filename) else None
+        if live and segments and os.path.samefile(live, segments[-1]):
+            live = None  # Archived by a compaction that didn't get to replace it
+        live_columns = parse_log(live) if live else None
+    return segments, live_columns
+
+
+# Every borrow and return on record, as columns: kind (BORROWED/RETURNED), title (index into
+# titles, a list of (item_type, title)), patron (index into patrons) and day (date ordinal). Events
+# are in the order they happened for each title. NumPy arrays when NumPy is installed, otherwise
+# stdlib arrays
+class LoanHistory:
+    def __init__(self):
+        self.titles = []
+        self.patrons = []
+        self._title_ids = {}
+        self._patron_ids = {}
+        self.kind = []
+        self.title = []
+        self.patron = []
+        self.day = []
+        self._field_values = {}  # Catalog field -> value for each title id
+        self._loans = None  # (title ids, return days, durations) of every completed loan
+
+    def __len__(self):
+        return len(self.kind)
+
+    # Loads the archived history and live logs of the given item types
+    @classmethod
+    @timed("stats.load")
+    def load(cls, item_types=ITEM_TYPES):
+        history = cls()
+        for item_type in item_types:
+            segments, live_columns = history_files(item_type)
+            for segment in segments:
+                history._add(item_type, load_segment(segment))
+            if live_columns is not None:
+                history._add(item_type, live_columns)
+        history._concatenate()
+        return history
+
+    def _add(self, item_type, columns):
+        title_map = []
+        for title in columns["titles"]:
+            key = (item_type, title)
+            if key not in self._title_ids:
+                self._title_ids[key] = len(self.titles)
+                self.titles.append(key)
+            title_map.append(self._title_ids[key])
+        patron_map = []
+        for patron in columns["patrons"]:
+            if patron not in self._patron_ids:
+                self._patron_ids[patron] = len(self.patrons)
+                self.patrons.append(patron)
+            patron_map.append(self._patron_ids[patron])
+        self.kind.append(columns["kind"])
+        self.day.append(columns["day"])
+        self.title.append(_remap(columns["title"], title_map))
+        self.patron.append(_remap(columns["patron"], patron_map))
+
+    def _concatenate(self):
+        for name in ("kind", "title", "patron", "day"):
+            parts = getattr(self, name)
+            if numpy is not None:
+                dtype = numpy.int8 if name == "kind" else numpy.int32
+                column = numpy.concatenate([numpy.asarray(part, dtype=dtype) for part in parts]) if parts \
+                    else numpy.zeros(0, dtype=dtype)
+            else:
+                column = array.array('b' if name == "kind" else 'i')
+                for part in parts:
+                    column.extend(part)
+            setattr(self, name, column)
+
+    # Event indexes (or a NumPy mask) of one kind with start <= date < end
+    def _select(self, kind, start, end):
+        low = _as_day(start, 1)
+        high = _as_day(end, datetime.date.max.toordinal() + 1)
+        if numpy is not None:
+            return (self.kind == kind) & (self.day >= low) & (self.day < high)
+        kinds, days = self.kind, self.day
+        return [i for i in range(len(kinds)) if kinds[i] == kind and low <= days[i] < high]
+
+    # Counts how often each title id appears among the selected events: {title id: count}
+    def _title_counts(self, selected):
+        if numpy is not None:
+            counts = numpy.bincount(self.title[selected], minlength=len(self.titles))
+            found = numpy.nonzero(counts)[0]
+            return dict(zip(found.tolist(), counts[found].tolist()))
+        title = self.title
+        return Counter(title[i] for i in selected)
+
+    # Returns [((item_type, title), loans)] for the n most borrowed titles
+    @timed("stats.top_titles")
+    def top_titles(self, n=10, start=None, end=None):
+        counts = self._title_counts(self._select(BORROWED, start, end))
+        top = sorted(counts.items(), key=lambda entry: (-entry[1], entry[0]))[:n]
+        return [(self.titles[title_id], loans) for title_id, loans in top]
+
+    # Loans grouped by a catalog field, or a tuple of fields (e.g. ("staff", "station")):
+    # {value: loans}, most first. Titles no longer in the catalog count under None
+    @timed("stats.loans_by")
+    def loans_by(self, field, start=None, end=None):
+        counts = self._title_counts(self._select(BORROWED, start, end))
+        values = self._catalog_values(field)
+        return _group((values[title_id], loans) for title_id, loans in counts.items())
+
+    # The catalog value of field (or tuple of fields) for every title id; None (a tuple of Nones for a
+    # tuple of fields) for titles no longer in the catalog. Looked up once per field, so each query
+    # joins on a list index
+    def _catalog_values(self, field):
+        values = self._field_values.get(field)
+        if values is None:
+            all_items = catalog.get()
+            missing = (None,) * len(field) if isinstance(field, tuple) else None
+            values = []
+            for item_type, title in self.titles:
+                details = all_items.get(item_type, {}).get(title)
+                if details is None:
+                    values.append(missing)
+                elif isinstance(field, tuple):
+                    values.append(tuple(details.get(name) for name in field))
+                else:
+                    values.append(details.get(field))
+            self._field_values[field] = values
+        return values
+
+    # (title ids, return days, durations in days) of every completed loan, worked out on first use.
+    # A loan is a borrow followed by the next return of the same title by the same patron
+    def _completed_loans(self):
+        if self._loans is not None:
+            return self._loans
+        if numpy is not None:
+            key = self.title.astype(numpy.int64) * max(len(self.patrons), 1) + self.patron
+            order = numpy.argsort(key, kind='stable')  # Keeps each loan's events in the order they happened
+            key, kind, day = key[order], self.kind[order], self.day[order]
+            pair = ((key[:-1] == key[1:]) & (kind[:-1] == BORROWED) & (kind[1:] == RETURNED)
+                    & (day[:-1] > 0) & (day[1:] > 0))
+            self._loans = (self.title[order][:-1][pair], day[1:][pair], (day[1:] - day[:-1])[pair])
+            return self._loans
+        borrowed = {}
+        titles, returned, durations = array.array('i'), array.array('i'), array.array('i')
+        kinds, title, patron, days = self.kind, self.title, self.patron, self.day
+        for i in range(len(kinds)):
+            loan = (title[i], patron[i])
+            if kinds[i] == BORROWED:
+                borrowed[loan] = days[i]
+            else:
+                borrowed_day = borrowed.pop(loan, 0)
+                if borrowed_day and days[i]:
+                    titles.append(title[i])
+                    returned.append(days[i])
+                    durations.append(days[i] - borrowed_day)
+        self._loans = (titles, returned, durations)
+        return self._loans
+
+    # (title ids, durations in days) of the loans returned with start <= return date < end
+    def _loan_durations(self, start, end):
+        low = _as_day(start, 1)
+        high = _as_day(end, datetime.date.max.toordinal() + 1)
+        titles, returned, durations = self._completed_loans()
+        if numpy is not None:
+            selected = (returned >= low) & (returned < high)
+            return titles[selected], durations[selected]
+        selected = [i for i in range(len(returned)) if low <= returned[i] < high]
+        return [titles[i] for i in selected], [durations[i] for i in selected]
+
+    # Average loan length in days, overall or grouped by a catalog field ({value: average days})
+    @timed("stats.loan_duration")
+    def average_loan_days(self, start=None, end=None, by=None):
+        titles, durations = self._loan_durations(start, end)
+        if by is None:
+            if not len(durations):
+                return None
+            return float(durations.mean()) if numpy is not None else sum(durations) / len(durations)
+        if numpy is not None:
+            found, inverse = numpy.unique(titles, return_inverse=True)
+            totals = numpy.bincount(inverse, weights=durations)
+            loans = numpy.bincount(inverse)
+            per_title = zip(found.tolist(), totals.tolist(), loans.tolist())
+        else:
+            totals, loans = Counter(), Counter()
+            for title_id, duration in zip(titles, durations):
+                totals[title_id] += duration
+                loans[title_id] += 1
+            per_title = ((title_id, totals[title_id], loans[title_id]) for title_id in loans)
+        values = self._catalog_values(by)
+        sums = {}
+        for title_id, total, count in per_title:
+            value = values[title_id]
+            entry = sums.setdefault(value, [0, 0])
+            entry[0] += total
+            entry[1] += count
+        return {value: total / count for value, (total, count) in
+                sorted(sums.items(), key=lambda entry: -entry[1][1])}
+
+    # Loans per day: {date: loans}
+    def daily_loans(self, start=None, end=None):
+        selected = self._select(BORROWED, start, end)
+        if numpy is not None:
+            days, counts = numpy.unique(self.day[selected], return_counts=True)
+            pairs = zip(days.tolist(), counts.tolist())
+        else:
+            day = self.day
+            pairs = sorted(Counter(day[i] for i in selected).items())
+        return {datetime.date.fromordinal(day): loans for day, loans in pairs if day}
+
+
+def _remap(codes, mapping):
+    if numpy is not None:
+        return numpy.asarray(mapping, dtype=numpy.int32)[numpy.asarray(codes)] if len(codes) \
+            else numpy.zeros(0, dtype=numpy.int32)
+    return array.array('i', [mapping[code] for code in codes])
+
+
+def _as_day(value, default):
+    if value is None:
+        return default
+    if isinstance(value, str):
+        value = datetime.date.fromisoformat(value)
+    return value.toordinal()
+
+
+# Sums (key, count) pairs into {key: total}, largest first
+def _group(pairs):
+    totals = Counter()
+    for key, count in pairs:
+        totals[key] += count
+    return dict(totals.most_common())
+
+
+# The day's numbers (or those of [start, end)): loans, top titles, loans by genre, author and
+# director, staff workload per station and average loan length
+def daily_stats(history, start, end=None, top=10):
+    start = _as_date(start)
+    end = _as_date(end) if end is not None else start + datetime.timedelta(days=1)
+    return {
+        "start": start, "end": end,
+        "loans": sum(history.daily_loans(start, end).values()),
+        "top_titles": history.top_titles(top, start, end),
+        "by_genre": history.loans_by("genre", start, end),
+        "by_author": history.loans_by("author", start, end),
+        "by_director": history.loans_by("director", start, end),
+        "staff_workload": history.loans_by(("staff", "station"), start, end),
+        "average_loan_days": history.average_loan_days(start, end),
+    }
+
+
+def _as_date(value):
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(value)
+
+
+def print_stats(stats, top=10):
+    print(f"Circulation {stats['start']} to {stats['end'] - datetime.timedelta(days=1)}: {stats['loans']} loans")
+    print("Top titles:")
+    for (item_type, title), loans in stats["top_titles"]:
+        print(f"  {loans:>6}  {title} ({item_type})")
+    for label, key in (("genre", "by_genre"), ("author", "by_author"), ("director", "by_director")):
+        print(f"Loans by {label}:")
+        for value, loans in list(stats[key].items())[:top]:
+            if value is not None:
+                print(f"  {loans:>6}  {value}")
+    print("Staff workload:")
+    for (staff, station), loans in stats["staff_workload"].items():
+        if staff is not None:
+            print(f"  {loans:>6}  {staff} (station {station})")
+    average = stats["average_loan_days"]
+    print(f"Average loan: {average:.1f} days" if average is not None else "Average loan: no returns")
+
+
+if __name__ == '__main__':
+    # Usage: python circulation_stats.py [day] | <start> <end>   (ISO dates; default today)
+    start = sys.argv[1] if len(sys.argv) > 1 else datetime.date.today()
+    end = sys.argv[2] if len(sys.argv) > 2 else None
+    print_stats(daily_stats(LoanHistory.load(), start, end))
@@ -0,0 +1,25 @@
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; locking becomes a no-op there
+    fcntl = None
+
+
+# Holds an exclusive advisory lock on '<filename>.lock' for the duration of the with-block,
+# so read-modify-write cycles from several terminals on the same directory don't interleave.
+# The lock file is opened read-only (flock doesn't need write access) and created with the umask's
+# mode, so terminals running as other users can still take the lock, e.g. to read a report
+@contextmanager
+def locked(filename):
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(filename + '.lock', os.O_RDONLY | os.O_CREAT, 0o666)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
@@ -0,0 +1,45 @@
+import json
+import os
+import tempfile
+from instrumentation import timed
+
+
+# Process umask, read once: os.umask can only be read by setting it, which isn't thread-safe
+_umask = os.umask(0)
+os.umask(_umask)
+
+
+# Gives a temp file from mkstemp (always 0600) the mode filename has now, or the umask default for a
+# new file, so replacing a file doesn't hide it from terminals running as other users
+def match_mode(fd, filename):
+    try:
+        mode = os.stat(filename).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = 0o666 & ~_umask
+    os.fchmod(fd, mode)
+
+
+# Writes text to filename via a temp file in the same directory and an atomic rename,
+# so readers (and a crash) only ever see the old or the new contents
+@timed("file.atomic_write")
+def atomic_write_text(filename, text):
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, temp_filename = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(filename), suffix='.tmp')
+    try:
+        match_mode(fd, filename)
+        with os.fdopen(fd, 'w') as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_filename, filename)
+    except BaseException:
+        try:
+            os.unlink(temp_filename)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+# Atomically replaces filename with the JSON encoding of data
+def atomic_write_json(filename, data, **kwargs):
+    atomic_write_text(filename, json.dumps(data, **kwargs))
@@ -0,0 +1,202 @@
+import atexit
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Opt-in timers and counters for the circulation hot paths, exported in the Prometheus text format.
+# Off unless LIBRARY_METRICS is set (or enable() is called); while off, an instrumented function
+# costs one flag check. LIBRARY_METRICS_FILE writes the metrics to a file at exit and
+# LIBRARY_METRICS_PORT serves them over HTTP at /metrics
+
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+           10.0)  # Seconds; a final +Inf bucket is implied
+OPERATION_SECONDS = "library_operation_seconds"
+EVENTS_TOTAL = "library_events_total"
+
+_enabled = False
+_lock = threading.Lock()
+_histograms = {}  # op -> [bucket counts..., +Inf count], sum
+_counters = {}  # event -> total
+_collectors = []  # callables returning [(metric name, type, help, {labels}, value)]
+_server = None
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+# Clears everything recorded so far
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def observe(op, seconds):
+    with _lock:
+        histogram = _histograms.get(op)
+        if histogram is None:
+            histogram = _histograms[op] = [[0] * (len(BUCKETS) + 1), 0.0]
+        histogram[0][bisect_left(BUCKETS, seconds)] += 1
+        histogram[1] += seconds
+
+
+# Adds amount to an event counter
+def count(event, amount=1):
+    if _enabled:
+        with _lock:
+            _counters[event] = _counters.get(event, 0) + amount
+
+
+class _Timer:
+    __slots__ = ('op', 'start')
+
+    def __init__(self, op):
+        self.op = op
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe(self.op, time.perf_counter() - self.start)
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NO_TIMER = _NoTimer()
+
+
+# Times a with-block into the histogram for op
+def timer(op):
+    return _Timer(op) if _enabled else _NO_TIMER
+
+
+# Decorator that times every call of a function into the histogram for op
+def timed(op):
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(op, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+# Registers a callable that reports current values (queue depths, cache hit counts) at export
+# time, so they cost nothing between scrapes
+def register_collector(collector):
+    _collectors.append(collector)
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels.items()) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Returns every metric in the Prometheus text exposition format
+def render():
+    lines = []
+    with _lock:
+        histograms = {op: (list(buckets), total) for op, (buckets, total) in _histograms.items()}
+        counters = dict(_counters)
+
+    lines.append(f"# HELP {OPERATION_SECONDS} Time spent in circulation operations, by operation.")
+    lines.append(f"# TYPE {OPERATION_SECONDS} histogram")
+    for op, (buckets, total) in sorted(histograms.items()):
+        cumulative = 0
+        for bound, bucket in zip(BUCKETS + ("+Inf",), buckets):
+            cumulative += bucket
+            lines.append(f'{OPERATION_SECONDS}_bucket{_labels({"op": op, "le": bound})} {cumulative}')
+        lines.append(f'{OPERATION_SECONDS}_sum{_labels({"op": op})} {_number(total)}')
+        lines.append(f'{OPERATION_SECONDS}_count{_labels({"op": op})} {cumulative}')
+
+    lines.append(f"# HELP {EVENTS_TOTAL} Circulation events, by event.")
+    lines.append(f"# TYPE {EVENTS_TOTAL} counter")
+    for event, total in sorted(counters.items()):
+        lines.append(f'{EVENTS_TOTAL}{_labels({"event": event})} {_number(total)}')
+
+    families = {}  # Samples of one metric must be listed together
+    for collector in _collectors:
+        for name, kind, help_text, labels, value in collector():
+            families.setdefault(name, (kind, help_text, []))[2].append((labels, value))
+    for name, (kind, help_text, samples) in families.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{_labels(labels)} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# Writes the current metrics to filename (e.g. for node_exporter's textfile collector)
+def write_file(filename):
+    from file_utils import atomic_write_text  # Imported here: file_utils is itself instrumented
+    atomic_write_text(filename, render())
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep scrapes out of the terminal
+
+
+# Serves the metrics at http://host:port/metrics from a background thread; returns the server
+def serve(port=9464, host='127.0.0.1'):
+    global _server
+    if _server is None:
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    return _server
+
+
+if os.environ.get("LIBRARY_METRICS", "0") not in ("", "0"):
+    enable()
+    if os.environ.get("LIBRARY_METRICS_PORT"):
+        serve(int(os.environ["LIBRARY_METRICS_PORT"]))
+    if os.environ.get("LIBRARY_METRICS_FILE"):
+        atexit.register(write_file, os.environ["LIBRARY_METRICS_FILE"])
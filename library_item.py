@@ -1,22 +1,126 @@
+import atexit
 import json
+import os
+import threading
 from abc import ABC, abstractmethod
-from staff_assignment import staff_assignment
+from file_utils import atomic_write_json
+from file_lock import locked
+from instrumentation import timed, timer
+from staff_assignment import catalog
+from availability import availability, copy_count
+from catalog_cache import CatalogListener, ReadOnlyView
+
+# Catalog record fields accepted for each item type
+COMMON_FIELDS = frozenset({"staff", "station", "publication_year", "language", "shelf_location", "condition",
+                           "copies"})
+ITEM_FIELDS = {
+    "Book": COMMON_FIELDS | {"author", "genre", "ISBN", "pages"},
+    "Magazine": COMMON_FIELDS | {"issue", "issue_number"},
+    "DVD": COMMON_FIELDS | {"director", "genre", "duration"},
+}
+REQUIRED_FIELDS = frozenset({"staff", "station"})  # Needed to route a checkout
+
+# Shared, read-only metadata for one catalog title; items of the same title point at one entry
+class CatalogEntry:
+    __slots__ = ('item_type', 'title', 'staff', 'publication_year', 'language', 'shelf_location')
+
+    def __init__(self, item_type, title, staff, publication_year, language, shelf_location):
+        self.item_type = item_type
+        self.title = title
+        self.staff = staff
+        self.publication_year = publication_year
+        self.language = language
+        self.shelf_location = shelf_location
+
+class BookEntry(CatalogEntry):
+    __slots__ = ('author', 'genre', 'ISBN', 'pages')
+
+class DVDEntry(CatalogEntry):
+    __slots__ = ('director', 'genre', 'duration')
+
+class MagazineEntry(CatalogEntry):
+    __slots__ = ('issue', 'issue_number')
+
+# Read-only attribute served from the item's shared CatalogEntry
+def _shared(field):
+    return property(lambda self: getattr(self._entry, field))
+
+# Interned CatalogEntry objects (item_type -> title -> entry) shared by every copy built from the
+# catalog; an entry is dropped when its record changes, and all of them when the catalog is reloaded
+class EntryCache(CatalogListener):
+    def __init__(self, source=catalog):
+        self.entries = {}
+        super().__init__(source)
+
+    # Returns the entries for one item type, emptied first if the catalog was reloaded from disk
+    def for_type(self, item_type):
+        self._ensure_current()
+        return self.entries.setdefault(item_type, {})
+
+    def rebuild(self, all_items=None):
+        self.entries.clear()
+        self._generation = self.source.generation
+
+    def add_item(self, item_type, title, details, previous=None):
+        self.entries.get(item_type, {}).pop(title, None)
+
+    def remove_item(self, item_type, title, details):
+        self.entries.get(item_type, {}).pop(title, None)
 
 # Abstract base class for all library items
 class LibraryItem(ABC):
+    __slots__ = ('_entry', 'available', 'condition', 'copy_id')  # Only per-copy state lives on the item
+
     _item_count = 0  # Tracks total count of all items in the library
     item_count_file = 'item_count.json'  # File to persist the item count across sessions
+    item_count_log = 'item_count.log'  # Write-ahead log of count changes not yet folded into item_count_file
+    item_count_write_through = False  # True saves the count on every change (the old behavior)
+    item_count_flush_interval = 5.0  # Seconds a changed count may stay unsaved in write-behind mode
+    item_count_flush_threshold = 100  # Pending changes that force an immediate flush
+    _pending_count_changes = 0  # Changes logged but not yet folded into item_count_file
+    _flush_timer = None
+    _count_lock = threading.RLock()
+    _entry_class = CatalogEntry  # Type of shared metadata entry used by this item class
+    _entry_cache = EntryCache()  # CatalogEntry shared by every copy of a title built from the catalog
+
+    _title = _shared('title')  # Item's title
+    _item_type = _shared('item_type')  # Type of item (e.g., Book, DVD, Magazine)
+    staff = _shared('staff')  # Staff member responsible for the item
+    publication_year = _shared('publication_year')  # Year the item was published
+    language = _shared('language')  # Language of the item
+    shelf_location = _shared('shelf_location')  # Location in the library
 
     # Initialize common attributes for each library item
     def __init__(self, title, item_type, publication_year, language, shelf_location, condition):
-        self._title = title  # Item's title
-        self._item_type = item_type  # Type of item (e.g., Book, DVD, Magazine)
+        self._entry = self._entry_class(item_type, title, catalog.get()[item_type][title],
+                                        publication_year, language, shelf_location)
         self.available = True  # Availability status
-        self.staff = staff_assignment[item_type][title]  # Staff member responsible for the item
-        self.publication_year = publication_year  # Year the item was published
-        self.language = language  # Language of the item
-        self.shelf_location = shelf_location  # Location in the library
         self.condition = condition  # Condition of the item (e.g., New, Good, Worn)
+        self.copy_id = None  # Which physical copy this is, once one has been checked out
+
+    # Builds an item for a catalog title, sharing one interned CatalogEntry per (item_type, title)
+    @classmethod
+    @timed("catalog.item_lookup")
+    def from_catalog(cls, item_type, title, condition=None):
+        staff_assignment = catalog.get()
+        item_data = staff_assignment[item_type][title]
+        item_class = ITEM_CLASSES[item_type]
+        entries = LibraryItem._entry_cache.for_type(item_type)
+        entry = entries.get(title)
+        if entry is None:
+            entry = item_class._entry_class(item_type, title, item_data,
+                                            item_data.get("publication_year", "Unknown"),
+                                            item_data.get("language", "English"),
+                                            item_data.get("shelf_location", "General"))
+            item_class._fill_entry(entry, item_data)
+            entries[title] = entry
+
+        item = object.__new__(item_class)
+        item._entry = entry
+        item.available = availability.available_copies(item_type, title) > 0
+        item.condition = item_data.get("condition", "Good") if condition is None else condition
+        item.copy_id = None
+        return item
 
     # Abstract method for checking out an item
     @abstractmethod
@@ -37,75 +141,204 @@ class LibraryItem(ABC):
     def total_items():
         return LibraryItem._item_count
 
-    # Increments item count and saves the updated count to a file
+    # Increments item count and schedules the updated count to be saved
     @staticmethod
     def increment_item_count():
-        LibraryItem._item_count += 1
-        LibraryItem.save_item_count()
+        with LibraryItem._count_lock:
+            LibraryItem._item_count += 1
+            LibraryItem._item_count_changed(1)
 
-    # Decrements item count if above zero, then saves the updated count
+    # Decrements item count if above zero, then schedules the updated count to be saved
     @staticmethod
     def decrement_item_count():
-        if LibraryItem._item_count > 0:
-            LibraryItem._item_count -= 1
+        with LibraryItem._count_lock:
+            if LibraryItem._item_count > 0:
+                LibraryItem._item_count -= 1
+                LibraryItem._item_count_changed(-1)
+
+    # Applies a batch of count changes at once (one pending change, however large the batch)
+    @staticmethod
+    def adjust_item_count(delta):
+        with LibraryItem._count_lock:
+            previous = LibraryItem._item_count
+            LibraryItem._item_count = max(previous + delta, 0)
+            LibraryItem._item_count_changed(LibraryItem._item_count - previous)
+
+    # Appends the change to the count log, so it survives a crash, then saves immediately in
+    # write-through mode, otherwise coalesces changes until the flush threshold is reached or
+    # the flush interval elapses
+    @staticmethod
+    def _item_count_changed(delta):
+        if not delta:
+            return
+        with locked(LibraryItem.item_count_file):
+            with timer("item_count.log"):
+                fd = os.open(LibraryItem.item_count_log, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+                try:
+                    os.write(fd, f"{delta:+d}\n".encode())
+                finally:
+                    os.close(fd)
+        LibraryItem._pending_count_changes += 1
+        if LibraryItem.item_count_write_through:
             LibraryItem.save_item_count()
+            return
+        if LibraryItem._pending_count_changes >= LibraryItem.item_count_flush_threshold:
+            LibraryItem.flush_item_count()
+        elif LibraryItem._flush_timer is None:
+            flush_timer = threading.Timer(LibraryItem.item_count_flush_interval, LibraryItem.flush_item_count)
+            flush_timer.daemon = True
+            LibraryItem._flush_timer = flush_timer
+            flush_timer.start()
+
+    # Writes any pending item count changes to the file
+    @staticmethod
+    def flush_item_count():
+        with LibraryItem._count_lock:
+            if LibraryItem._flush_timer is not None:
+                if LibraryItem._flush_timer is not threading.current_thread():
+                    LibraryItem._flush_timer.cancel()
+                LibraryItem._flush_timer = None
+            if LibraryItem._pending_count_changes:
+                LibraryItem.save_item_count()
 
-    # Initializes item count from the file or calculates it if the file is missing
+    # Initializes item count from the file (calculating it if the file is missing) and replays any
+    # changes left in the count log, e.g. by a session that crashed before saving
     @staticmethod
+    @timed("item_count.load")
     def initialize_item_count():
+        with LibraryItem._count_lock:
+            with locked(LibraryItem.item_count_file):
+                try:
+                    with open(LibraryItem.item_count_file, 'r') as file:
+                        LibraryItem._item_count = json.load(file)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    LibraryItem._item_count = sum(copy_count(details) for items in catalog.get().values()
+                                                  for details in items.values())
+                    atomic_write_json(LibraryItem.item_count_file, LibraryItem._item_count)
+            if os.path.exists(LibraryItem.item_count_log) and os.path.getsize(LibraryItem.item_count_log):
+                LibraryItem.save_item_count()
+
+    # Reads the count log: each line is a signed change, or "=N" for a count already being saved as N.
+    # Returns (count, whether the log held anything) given the count in item_count_file
+    @staticmethod
+    def _replay_count_log(count):
         try:
-            with open(LibraryItem.item_count_file, 'r') as file:
-                LibraryItem._item_count = json.load(file)
-        except (FileNotFoundError, json.JSONDecodeError):
-            LibraryItem._item_count = sum(len(items) for items in staff_assignment.values())
-            LibraryItem.save_item_count()
+            with open(LibraryItem.item_count_log, 'r') as file:
+                lines = file.read().split("\n")[:-1]  # Drop a trailing partial line
+        except FileNotFoundError:
+            return count, False
+        for line in lines:
+            if line.startswith("="):
+                count = int(line[1:])
+            elif line:
+                count = max(count + int(line), 0)
+        return count, bool(lines)
 
-    # Saves the item count to a JSON file for persistence
+    # Folds the count log into item_count_file (temp file + rename, so never truncated). Under the
+    # file lock, every terminal's logged changes are applied to whatever the file holds now. The new
+    # count is logged as "=N" before the file is replaced and the log emptied, so a crash part-way
+    # through never applies the same changes twice
     @staticmethod
+    @timed("item_count.save")
     def save_item_count():
-        with open(LibraryItem.item_count_file, 'w') as file:
-            json.dump(LibraryItem._item_count, file)
+        with LibraryItem._count_lock, locked(LibraryItem.item_count_file):
+            try:
+                with open(LibraryItem.item_count_file, 'r') as file:
+                    count, logged = LibraryItem._replay_count_log(json.load(file))
+            except (FileNotFoundError, json.JSONDecodeError):
+                count = LibraryItem._item_count  # Already includes this process's logged changes
+                logged = os.path.exists(LibraryItem.item_count_log)
+            if logged:
+                with open(LibraryItem.item_count_log, 'a') as file:
+                    file.write(f"={count}\n")
+            atomic_write_json(LibraryItem.item_count_file, count)
+            if logged:
+                with open(LibraryItem.item_count_log, 'w'):
+                    pass
+            LibraryItem._item_count = count
+            LibraryItem._pending_count_changes = 0
 
-    # Adds a new item to the staff assignment and increments the count
+    # Adds a new item to the staff assignment and adds its copies to the count (the change in copies,
+    # if it replaces a record)
     @classmethod
     def add_item(cls, item_type, title, details):
-        if item_type in staff_assignment:
-            staff_assignment[item_type][title] = details
-            cls.increment_item_count()
+        if item_type in catalog.get():
+            previous = catalog.set_item(item_type, title, details)  # Also updates every index built on the catalog
+            cls.adjust_item_count(copy_count(details) - (copy_count(previous) if previous is not None else 0))
         else:
             print("Invalid item type.")
 
-    # Removes an item from staff assignment and decrements the count
+    # Adds many items of one type at once; the item count (by copies) is updated once for the batch.
+    # Returns the number of titles that were new to the catalog
+    @classmethod
+    def add_items(cls, item_type, items):
+        if item_type not in catalog.get():
+            print("Invalid item type.")
+            return 0
+        added = 0
+        copies = 0
+        for _, details, previous in catalog.set_items(item_type, items):  # Indexes are told once per batch
+            copies += copy_count(details) - (copy_count(previous) if previous is not None else 0)
+            if previous is None:
+                added += 1
+        if copies:
+            cls.adjust_item_count(copies)
+        return added
+
+    # Removes an item from staff assignment and takes its copies on the shelf off the count (copies
+    # on loan already were)
     @classmethod
     def remove_item(cls, item_type, title):
+        staff_assignment = catalog.get()
         if item_type in staff_assignment and title in staff_assignment[item_type]:
-            del staff_assignment[item_type][title]
-            cls.decrement_item_count()
+            availability.refresh_title(item_type, title)
+            on_shelf = availability.available_copies(item_type, title)
+            catalog.pop_item(item_type, title)  # Also updates every index built on the catalog
+            cls.adjust_item_count(-on_shelf)
         else:
             print("Item not found.")
 
     # Searches for an item in the staff assignment by type and title
     @classmethod
     def search_item(cls, item_type, title):
+        staff_assignment = catalog.get()
         if item_type in staff_assignment:
             return staff_assignment[item_type].get(title, "Item not found.")
         return "Invalid item type."
 
-    # Retrieves all items currently available in the library
+    # Retrieves all items currently in the library as a read-only view of the shared catalog;
+    # use add_item/remove_item to change it
     @classmethod
     def get_all_items(cls):
-        return staff_assignment
+        return ReadOnlyView(catalog.get())
 
 # Class representing a Book, inherits from LibraryItem
 class Book(LibraryItem):
+    __slots__ = ()
+    _entry_class = BookEntry
+
+    _author = _shared('author')  # Author of the book
+    _genre = _shared('genre')  # Genre of the book
+    ISBN = _shared('ISBN')  # ISBN identifier
+    pages = _shared('pages')  # Number of pages
+
     def __init__(self, title, author, genre, ISBN, pages, publication_year, language, shelf_location, condition):
         super().__init__(title, "Book", publication_year, language, shelf_location, condition)
-        self._author = author  # Author of the book
-        self._genre = genre  # Genre of the book
-        self.ISBN = ISBN  # ISBN identifier
-        self.pages = pages  # Number of pages
+        self._entry.author = author
+        self._entry.genre = genre
+        self._entry.ISBN = ISBN
+        self._entry.pages = pages
+
+    # Copies the book-specific catalog fields into a shared entry
+    @staticmethod
+    def _fill_entry(entry, item_data):
+        entry.author = item_data.get("author")
+        entry.genre = item_data.get("genre")
+        entry.ISBN = item_data.get("ISBN", "N/A")
+        entry.pages = item_data.get("pages", 0)
 
     # Method to check out a book
+    @timed("item.check_out")
     def check_out(self):
         print(f"\nAttempting to check out Book '{self._title}'.")
         if self.available:
@@ -116,6 +349,7 @@ class Book(LibraryItem):
             print(f'Book "{self._title}" is currently unavailable.')
 
     # Method to return a book
+    @timed("item.return")
     def return_item(self):
         if self.available:
             self.available = False
@@ -133,12 +367,26 @@ class Book(LibraryItem):
                 f"Language: {self.language}\nShelf Location: {self.shelf_location}\nCondition: {self.condition}")
 
 class DVD(LibraryItem):
+    __slots__ = ()
+    _entry_class = DVDEntry
+
+    _director = _shared('director')
+    _genre = _shared('genre')
+    duration = _shared('duration')
+
     def __init__(self, title, director, genre, duration, publication_year, language, shelf_location, condition):
         super().__init__(title, "DVD", publication_year, language, shelf_location, condition)
-        self._director = director
-        self._genre = genre
-        self.duration = duration
+        self._entry.director = director
+        self._entry.genre = genre
+        self._entry.duration = duration
+
+    @staticmethod
+    def _fill_entry(entry, item_data):
+        entry.director = item_data.get("director")
+        entry.genre = item_data.get("genre")
+        entry.duration = item_data.get("duration", 0)
 
+    @timed("item.check_out")
     def check_out(self):
         print(f"\nAttempting to check out DVD '{self._title}'.")
         if self.available:
@@ -148,6 +396,7 @@ class DVD(LibraryItem):
         else:
             print(f'DVD "{self._title}" is currently unavailable.')
 
+    @timed("item.return")
     def return_item(self):
         if self.available:
             self.available = False
@@ -164,11 +413,23 @@ class DVD(LibraryItem):
                 f"Language: {self.language}\nShelf Location: {self.shelf_location}\nCondition: {self.condition}")
 
 class Magazine(LibraryItem):
+    __slots__ = ()
+    _entry_class = MagazineEntry
+
+    _issue = _shared('issue')
+    issue_number = _shared('issue_number')
+
     def __init__(self, title, issue, issue_number, publication_year, language, shelf_location, condition):
         super().__init__(title, "Magazine", publication_year, language, shelf_location, condition)
-        self._issue = issue
-        self.issue_number = issue_number
+        self._entry.issue = issue
+        self._entry.issue_number = issue_number
 
+    @staticmethod
+    def _fill_entry(entry, item_data):
+        entry.issue = item_data.get("issue")
+        entry.issue_number = item_data.get("issue_number", 0)
+
+    @timed("item.check_out")
     def check_out(self):
         print(f"\nAttempting to check out Magazine '{self._title}'.")
         if self.available:
@@ -178,6 +439,7 @@ class Magazine(LibraryItem):
         else:
             print(f'Magazine "{self._title}" is currently unavailable.')
 
+    @timed("item.return")
     def return_item(self):
         if self.available:
             self.available = False
@@ -191,3 +453,11 @@ class Magazine(LibraryItem):
     def __str__(self):
         return (f"Magazine Title: {self._title}\nIssue: {self._issue}\nIssue Number: {self.issue_number}\n"
                 f"Publication Year: {self.publication_year}\nLanguage: {self.language}\nShelf Location: {self.shelf_location}\nCondition: {self.condition}")
+
+
+# Item class for each catalog item type
+ITEM_CLASSES = {"Book": Book, "Magazine": Magazine, "DVD": DVD}
+
+
+# Make sure write-behind item count changes reach the file when the process exits
+atexit.register(LibraryItem.flush_item_count)
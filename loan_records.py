@@ -0,0 +1,161 @@
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right
+from borrowing_ledger import parse_legacy_line, format_legacy_line
+from file_utils import match_mode
+from instrumentation import timed
+
+# Binary loan file layout (little-endian):
+#   header   8-byte magic, record count (uint64), offset of the index (uint64)
+#   records  5 x uint16 field lengths, then the UTF-8 bytes of patron_name, item_title,
+#            date_borrowed, due_date, copy_id; records are sorted by (patron_name, item_title)
+#   index    one uint64 file offset per record, in record order
+MAGIC = b"LOANREC1"
+HEADER = struct.Struct("<8sQQ")
+LENGTHS = struct.Struct("<5H")
+FIELD_COUNT = 5
+
+
+def _encode(loan):
+    fields = [str(field).encode('utf-8') for field in loan]
+    if len(fields) != FIELD_COUNT:
+        raise ValueError(f"expected {FIELD_COUNT} fields, got {len(fields)}")
+    if any(len(field) > 0xFFFF for field in fields):
+        raise ValueError("loan field longer than 65535 bytes")
+    return LENGTHS.pack(*(len(field) for field in fields)) + b"".join(fields)
+
+
+# Writes loans, each (patron_name, item_title, date_borrowed, due_date, copy_id), to a binary loan
+# file. loans must already be sorted by (patron_name, item_title); use write_sorted otherwise.
+# The file is written to a temporary name and renamed, so readers never see half a file
+@timed("loan_file.write")
+def write_loan_file(filename, loans):
+    offsets = array('Q')
+    directory = os.path.dirname(os.path.abspath(filename))
+    descriptor, temp_filename = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        match_mode(descriptor, filename)
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, 0, 0))
+            position = HEADER.size
+            for loan in loans:
+                data = _encode(loan)
+                offsets.append(position)
+                file.write(data)
+                position += len(data)
+            file.write(offsets.tobytes())
+            file.seek(0)
+            file.write(HEADER.pack(MAGIC, len(offsets), position))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_filename, filename)
+    except BaseException:
+        os.unlink(temp_filename)
+        raise
+    return len(offsets)
+
+
+def write_sorted(filename, loans):
+    return write_loan_file(filename, sorted(loans, key=lambda loan: (str(loan[0]), str(loan[1]))))
+
+
+# Read-only, memory-mapped view of a binary loan file. Records are decoded only when asked for;
+# patron and patron/title lookups binary-search the offset index and decode just the key fields
+# of the records they probe
+class LoanFile:
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._count, index_offset = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"{filename} is not a loan record file")
+        self._offsets = memoryview(self._map)[index_offset:index_offset + 8 * self._count].cast('Q')
+
+    def __len__(self):
+        return self._count
+
+    # Returns the first `fields` fields of record i
+    def _fields(self, i, fields=FIELD_COUNT):
+        position = self._offsets[i]
+        lengths = LENGTHS.unpack_from(self._map, position)
+        position += LENGTHS.size
+        values = []
+        for length in lengths[:fields]:
+            values.append(self._map[position:position + length].decode('utf-8'))
+            position += length
+        return tuple(values)
+
+    def __getitem__(self, i):
+        if not -self._count <= i < self._count:
+            raise IndexError("loan record index out of range")
+        return self._fields(i % self._count)
+
+    # Decodes every record in file order; a sequential scan that doesn't go through the index
+    def __iter__(self):
+        data, position = self._map, HEADER.size
+        for _ in range(self._count):
+            lengths = LENGTHS.unpack_from(data, position)
+            position += LENGTHS.size
+            values = []
+            for length in lengths:
+                values.append(data[position:position + length].decode('utf-8'))
+                position += length
+            yield tuple(values)
+
+    def _patron(self, i):
+        return self._fields(i, 1)[0]
+
+    # Returns every loan of one patron, in title order
+    def find_patron(self, patron_name):
+        start = bisect_left(range(self._count), patron_name, key=self._patron)
+        end = bisect_right(range(self._count), patron_name, lo=start, key=self._patron)
+        return [self._fields(i) for i in range(start, end)]
+
+    # Returns the loan of item_title by patron_name, or None
+    def get(self, patron_name, item_title):
+        key = (patron_name, item_title)
+        i = bisect_left(range(self._count), key, key=lambda i: self._fields(i, 2))
+        if i < self._count and self._fields(i, 2) == key:
+            return self._fields(i)
+        return None
+
+    def close(self):
+        self._offsets.release()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Converts a legacy borrowing_data_<type>.txt file to a binary loan file; returns the record count
+def convert_legacy(text_filename, loan_filename):
+    with open(text_filename, 'r', encoding='utf-8') as file:
+        loans = [loan + ("",) for loan in map(parse_legacy_line, file) if loan]
+    return write_sorted(loan_filename, loans)
+
+
+# Writes a binary loan file back out in the legacy text format
+def export_legacy(loan_filename, text_filename):
+    with LoanFile(loan_filename) as loans, open(text_filename, 'w', encoding='utf-8') as file:
+        for patron_name, item_title, date_borrowed, due_date, _ in loans:
+            file.write(format_legacy_line(patron_name, item_title, date_borrowed, due_date))
+
+
+if __name__ == '__main__':
+    # Usage: python loan_records.py to-binary borrowing_data_book.txt borrowing_data_book.loans
+    #        python loan_records.py to-text borrowing_data_book.loans borrowing_data_book.txt
+    if len(sys.argv) == 4 and sys.argv[1] == "to-binary":
+        print(f"Converted {convert_legacy(sys.argv[2], sys.argv[3])} loans.")
+    elif len(sys.argv) == 4 and sys.argv[1] == "to-text":
+        export_legacy(sys.argv[2], sys.argv[3])
+    else:
+        print("Usage: python loan_records.py to-binary|to-text <source> <destination>")
@@ -1,14 +1,15 @@
-import json
 from patron import Patron
-from library_item import Book, Magazine, DVD, LibraryItem
-from staff_assignment import staff_assignment
-
-# Load the staff_assignment.txt data
+from library_item import LibraryItem
+from staff_assignment import catalog
+from availability import availability
+from title_search import title_search
+from catalog_browser import catalog_browser, PAGE_SIZE
+from persistence import recover
+
+# Get the staff_assignment.txt data from the in-memory catalog cache
 def load_staff_assignment():
     try:
-        with open("staff_assignment.txt", "r") as file:
-            data = json.load(file)
-        return data
+        return catalog.get()
     except FileNotFoundError:
         print("Error: staff_assignment.txt file not found.")
         return {}
@@ -28,8 +29,13 @@ def search_item(item_type, title):
         staff = item_info.get("staff")
         station = item_info.get("station")
         
-        # Display general information
-        print(f"'{title}' ({item_type}) is available.")
+        # Display general information, with copies other terminals lent or took back since our last look
+        availability.refresh_title(item_type, title)
+        copies = availability.available_copies(item_type, title)
+        if copies:
+            print(f"'{title}' ({item_type}) is available ({copies} on the shelf).")
+        else:
+            print(f"'{title}' ({item_type}) is in the catalog, but every copy is checked out.")
         print(f"Assigned to staff: {staff}, Station: {station}")
 
         # Additional details based on item type
@@ -51,17 +57,36 @@ def search_item(item_type, title):
 
     else:
         print(f"'{title}' ({item_type}) is not available.")
+        print_suggestions(title_search.search(title, limit=5, item_type=item_type))
         return False
 
+# Lists close title matches after a failed lookup
+def print_suggestions(matches):
+    if matches:
+        print("Did you mean:")
+        for item_type, title in matches:
+            print(f" - {title} ({item_type})")
+
 def borrow_or_return_item(patron):
     while True:
-        item_type = input("\nWhat type of item would you like to search for? (Book/Magazine/DVD): ").strip()
+        staff_assignment = load_staff_assignment()
+        item_type = input("\nWhat type of item would you like to search for? "
+                          "(Book/Magazine/DVD, a title to search everything, or 'browse'): ").strip()
 
-        if item_type not in staff_assignment:
-            print("Invalid item type selected.")
+        if item_type.lower() == "browse":
+            browse_catalog()
             continue
-
-        title = input(f"Enter the title of the {item_type}: ").strip()
+        if item_type in staff_assignment:
+            title = input(f"Enter the title of the {item_type}: ").strip()
+        else:
+            # Not an item type: search every type's titles for what was typed
+            matches = title_search.search(item_type, limit=5)
+            exact = [match for match in matches if match[1] == item_type]
+            if len(exact) != 1:
+                print("No exact title match found." if matches else "Invalid item type selected.")
+                print_suggestions(matches)
+                continue
+            item_type, title = exact[0]
 
         if not search_item(item_type, title):
             continue
@@ -72,26 +97,8 @@ def borrow_or_return_item(patron):
             print("Invalid action.")
             continue
 
-        # Retrieve item data and additional attributes
-        item_data = staff_assignment[item_type][title]
-        publication_year = item_data.get("publication_year", "Unknown")
-        language = item_data.get("language", "English")
-        shelf_location = item_data.get("shelf_location", "General")
-        condition = item_data.get("condition", "Good")
-
-        # Initialize the item based on type
-        if item_type == "Book":
-            item = Book(title, item_data.get("author"), item_data.get("genre"),
-                        item_data.get("ISBN", "N/A"), item_data.get("pages", 0),
-                        publication_year, language, shelf_location, condition)
-        elif item_type == "Magazine":
-            item = Magazine(title, item_data.get("issue"),
-                            item_data.get("issue_number", 0),
-                            publication_year, language, shelf_location, condition)
-        elif item_type == "DVD":
-            item = DVD(title, item_data.get("director"), item_data.get("genre"),
-                       item_data.get("duration", 0),
-                       publication_year, language, shelf_location, condition)
+        # Build the item from the catalog; copies of a title share one catalog entry
+        item = LibraryItem.from_catalog(item_type, title)
 
         # Perform borrow or return action
         if action == "borrow":
@@ -110,17 +117,39 @@ def borrow_or_return_item(patron):
             print("Thank you for using the library system!")
             break
 
-# Use the new class method to display all items in the library
+# Prints every item in the library, one type at a time, streaming from the sorted title lists
 def display_all_items():
-    all_items = LibraryItem.get_all_items()
-    for item_type, items in all_items.items():
+    for item_type in LibraryItem.get_all_items():
         print(f"\n{item_type}s in Library:")
-        for title, details in items.items():
+        for _, title, _ in catalog_browser.browse(item_type):
             print(f" - {title}")
 
+# Prints one page of the catalog and returns the cursor for the next page (None after the last page)
+def display_catalog_page(cursor=None, item_type=None):
+    items, next_cursor = catalog_browser.page_after(cursor, PAGE_SIZE, item_type)
+    for found_type, title, details in items:
+        print(f" - {title} ({found_type})")
+    return next_cursor
+
+# Lets the patron page through the catalog, optionally limited to one item type
+def browse_catalog():
+    item_type, cursor = None, None
+    while True:
+        shown = catalog_browser.count(item_type)
+        print(f"\n{item_type + 's' if item_type else 'Catalog'} ({shown} titles):")
+        cursor = display_catalog_page(cursor, item_type)
+        choice = input("Enter for the next page, Book/Magazine/DVD/all to filter, or q to stop: ").strip()
+        if choice.lower() == "q":
+            return
+        if choice in LibraryItem.get_all_items() or choice.lower() == "all":
+            item_type, cursor = (None if choice.lower() == "all" else choice), None
+        elif cursor is None:
+            print("That was the last page.")
+            return
+
 if __name__ == '__main__':
     # Initialize item count based on staff_assignment or previous run
-    LibraryItem.initialize_item_count()
+    recover()  # Load the snapshots and replay whatever the last session logged after them
     print(f"The Library has {LibraryItem._item_count} available items")
 
     # Main script
@@ -129,9 +158,10 @@ if __name__ == '__main__':
     # Load the patron's data if it exists
     patron = Patron.load_patron_data(user_name)
 
-    # Display all items in the library for the user
-    print("\nLibrary Catalog:")
-    display_all_items()
+    # Show the first page of the catalog; the rest is a 'browse' away
+    print(f"\nLibrary Catalog ({catalog_browser.count()} titles):")
+    if display_catalog_page() is not None:
+        print("Enter 'browse' at the search prompt to see more.")
 
     # Start the borrowing/returning process
     borrow_or_return_item(patron)
@@ -0,0 +1,161 @@
+import csv
+import datetime
+import heapq
+import itertools
+import os
+import pickle
+import sys
+import tempfile
+from borrowing_ledger import get_ledger, iter_snapshot, parse_record, parse_legacy_line, BORROW
+from file_lock import locked
+from library_item import ITEM_FIELDS
+
+ITEM_TYPES = tuple(ITEM_FIELDS)
+CSV_HEADER = ("due_date", "item_type", "patron_name", "item_title", "date_borrowed", "copy_id", "days_overdue")
+
+
+def _as_date(value):
+    if value is None:
+        return datetime.date.today()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(value)
+
+
+def _days_overdue(due_date, as_of):
+    try:
+        return max((as_of - datetime.date.fromisoformat(due_date)).days, 0)
+    except ValueError:
+        return ""  # Due date that isn't an ISO date (hand-edited legacy data)
+
+
+# Yields (due_date, item_type, patron_name, item_title, date_borrowed, copy_id) for open loans with
+# start <= due_date < end, earliest due first, merging each item type's due-date index
+def loans_due_between(start=None, end=None, item_types=ITEM_TYPES):
+    return heapq.merge(*(_typed_loans(item_type, start, end) for item_type in item_types))
+
+
+def _typed_loans(item_type, start, end):
+    for due_date, patron_name, item_title, date_borrowed, copy_id in get_ledger(item_type).loans_due_between(start, end):
+        yield due_date, item_type, patron_name, item_title, date_borrowed, copy_id
+
+
+# Loans whose due date is before as_of (default today)
+def overdue(as_of=None, item_types=ITEM_TYPES):
+    return loans_due_between(end=_as_date(as_of), item_types=item_types)
+
+
+# Loans due from today (or as_of) up to and including days from now
+def due_within(days, as_of=None, item_types=ITEM_TYPES):
+    start = _as_date(as_of)
+    return loans_due_between(start, start + datetime.timedelta(days=days + 1), item_types)
+
+
+# Writes loans to file as CSV one row at a time
+def write_csv(loans, file, as_of=None):
+    as_of = _as_date(as_of)
+    writer = csv.writer(file)
+    writer.writerow(CSV_HEADER)
+    count = 0
+    for loan in loans:
+        writer.writerow(loan + (_days_overdue(loan[0], as_of),))
+        count += 1
+    return count
+
+
+# Sorts records that may not fit in memory: sorted runs of chunk_size records are spilled to
+# temporary files and merged back lazily. Yields the records in key order
+def _external_sort(records, key, chunk_size, directory=None):
+    runs = []
+    try:
+        while True:
+            chunk = sorted(itertools.islice(records, chunk_size), key=key)
+            if not chunk:
+                break
+            run = tempfile.TemporaryFile(dir=directory)
+            for record in chunk:
+                pickle.dump(record, run, pickle.HIGHEST_PROTOCOL)
+            run.seek(0)
+            runs.append(run)
+            del chunk
+        yield from heapq.merge(*(_read_run(run) for run in runs), key=key)
+    finally:
+        for run in runs:
+            run.close()
+
+
+def _read_run(run):
+    while True:
+        try:
+            yield pickle.load(run)
+        except EOFError:
+            return
+
+
+# Yields (item_type, patron_name, item_title, sequence, fields) for every record in the ledger files:
+# the snapshot's loans (as borrow records) first, then the log written since
+def _ledger_records(item_types):
+    for item_type in item_types:
+        ledger = get_ledger(item_type)
+        if os.path.exists(ledger.filename) or os.path.exists(ledger.snapshot_filename):
+            sequence = itertools.count()
+            # Open both under the lock so a compaction can't pair the old snapshot with the new log
+            with locked(ledger.filename):
+                log = open(ledger.filename, 'r', encoding='utf-8') if os.path.exists(ledger.filename) else None
+                snapshot = iter_snapshot(ledger.snapshot_filename)
+            for loan in snapshot:
+                yield item_type, loan[0], loan[1], next(sequence), [BORROW, *loan]
+            if log is None:
+                continue
+            with log:
+                for line in log:
+                    if not line.endswith("\n"):
+                        break  # Record still being written
+                    fields = parse_record(line)
+                    if fields is not None:
+                        yield item_type, fields[1], fields[2], next(sequence), fields
+        elif os.path.exists(ledger.legacy_filename):
+            with open(ledger.legacy_filename, 'r', encoding='utf-8') as file:
+                for sequence, line in enumerate(file):
+                    loan = parse_legacy_line(line)
+                    if loan:
+                        yield item_type, loan[0], loan[1], sequence, [BORROW, *loan, ""]
+
+
+# Nightly report: streams every open loan due before as_of straight from the ledger files to a CSV,
+# without loading the ledgers. Records are externally sorted by (patron, title) to find each loan's
+# latest state, then the open, overdue ones are externally sorted by due date, so memory stays
+# bounded by chunk_size however many loans there are. Returns the number of rows written
+def nightly_report(output, as_of=None, item_types=ITEM_TYPES, chunk_size=200_000):
+    as_of = _as_date(as_of)
+    cutoff = as_of.isoformat()
+    by_loan = _external_sort(_ledger_records(item_types), key=lambda record: record[:4], chunk_size=chunk_size)
+
+    def overdue_loans():
+        for _, records in itertools.groupby(by_loan, key=lambda record: record[:3]):
+            for record in records:
+                pass  # The last record for a loan decides whether it is still open
+            item_type, patron_name, item_title, _, fields = record
+            if fields[0] == BORROW and fields[4] < cutoff:
+                yield fields[4], item_type, patron_name, item_title, fields[3], fields[5] if len(fields) > 5 else ""
+
+    by_due_date = _external_sort(overdue_loans(), key=None, chunk_size=chunk_size)
+    with open(output, 'w', newline='', encoding='utf-8') as file:
+        return write_csv(by_due_date, file, as_of)
+
+
+if __name__ == '__main__':
+    # Usage: python overdue_report.py overdue [as_of]
+    #        python overdue_report.py due [days]
+    #        python overdue_report.py nightly <output.csv> [as_of]
+    command = sys.argv[1] if len(sys.argv) > 1 else "overdue"
+    if command == "overdue":
+        as_of = sys.argv[2] if len(sys.argv) > 2 else None
+        write_csv(overdue(as_of), sys.stdout, as_of)
+    elif command == "due":
+        write_csv(due_within(int(sys.argv[2]) if len(sys.argv) > 2 else 7), sys.stdout)
+    elif command == "nightly" and len(sys.argv) > 2:
+        rows = nightly_report(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
+        print(f"Wrote {rows} overdue loans to {sys.argv[2]}.")
+    else:
+        print("Usage: python overdue_report.py overdue [as_of] | due [days] | nightly <output.csv> [as_of]")
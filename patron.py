@@ -1,18 +1,86 @@
-import json
 import datetime
 from borrowing_data import append_borrowing_data, delete_borrowing_data
-from library_item import Book, Magazine, DVD
-from staff_assignment import staff_assignment
+from borrowing_ledger import get_ledger
+from library_item import LibraryItem, ITEM_CLASSES
+from patron_store import PatronStore
+from availability import availability
+from station_router import station_router
+from instrumentation import timed
+
+
+def reconcile_items(patron_name, saved_items, ledger_loans=None):
+    """Bring a patron's saved item list in step with the borrowing ledgers, which record every
+    loan and return as it happens: drop items the ledgers show as returned, add loans that were
+    never saved (say, by a session that crashed) and take each copy id from the ledger, which
+    reserved it. ledger_loans ({item_type: loans_for(patron_name)}) saves reading the ledgers
+    again when the caller already has the patron's loans. Returns the reconciled list, saved
+    order first."""
+    loans = {}
+    for item_type in ITEM_CLASSES:
+        found = get_ledger(item_type).loans_for(patron_name) if ledger_loans is None else ledger_loans[item_type]
+        for title, _, _, copy_id in found:
+            loans[(item_type, title)] = int(copy_id) if str(copy_id).isdigit() else None
+    items = []
+    for item in saved_items or ():
+        key = (item["type"], item["title"])
+        if item["type"] not in ITEM_CLASSES or key in loans:
+            copy_id = loans.pop(key, None)
+            if copy_id is not None and item.get("copy_id") != copy_id:
+                item = dict(item, copy_id=copy_id)
+            items.append(item)
+    items.extend({"title": title, "type": item_type, "copy_id": copy_id} for (item_type, title), copy_id in loans.items())
+    return items
+
+
+class LoanSet:
+    """A patron's checked-out items keyed by (item_type, title), kept in the order they were borrowed."""
+
+    def __init__(self, items=()):
+        self._items = {}  # (item_type, title) -> LibraryItem
+        for item in items:
+            self.add(item)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items.values())
+
+    def __contains__(self, key):
+        """Check for a loan by (item_type, title) key or by item."""
+        if not isinstance(key, tuple):
+            key = (key._item_type, key._title)
+        return key in self._items
+
+    def get(self, item_type, title):
+        """Return the checked-out item for this title, or None."""
+        return self._items.get((item_type, title))
+
+    def add(self, item):
+        """Add a loan; returns False if this title is already checked out."""
+        key = (item._item_type, item._title)
+        if key in self._items:
+            return False
+        self._items[key] = item
+        return True
+
+    def remove(self, item_type, title):
+        """Remove and return the loan for this title, or None if it isn't checked out."""
+        return self._items.pop((item_type, title), None)
+
 
 class Patron:
-    patrons_data_file = 'patrons_data.json'  # File to store patron data
+    patrons_data_file = 'patrons_data.json'  # Legacy patron data file, migrated into the store
+    store = PatronStore('patrons.db', legacy_filename=patrons_data_file)  # Per-patron keyed records
     patron_count = 0  # Track total patrons in the system
+    default_tier = "standard"
+    tier_limits = {"standard": 5, "institutional": 500}  # Most items each tier may have checked out at once
 
     def __init__(self, name):
         """Initialize a Patron with a unique name and load or increment the count."""
         self.__name = name
-        self.checked_out_items = []  # Holds checked-out LibraryItem objects for the patron
-        self.borrowed_count = 0  # Tracks the count of items the patron has borrowed
+        self.checked_out_items = LoanSet()  # Holds checked-out LibraryItem objects for the patron
+        self.tier = Patron.default_tier  # Borrowing tier, sets the patron's item limit
         self.load_patron_count()
 
         # If this patron is new, increase the overall patron count
@@ -20,70 +88,86 @@ class Patron:
             Patron.patron_count += 1
 
     def load_patron_count(self):
-        """Load total number of patrons from the data file if it exists."""
-        try:
-            with open(Patron.patrons_data_file, 'r') as file:
-                patrons_data = json.load(file)
-                if 'patron_count' in patrons_data:
-                    Patron.patron_count = patrons_data['patron_count']
-        except FileNotFoundError:
-            Patron.patron_count = 0  # Initialize count to 0 if file not found
+        """Load total number of patrons from the patron store."""
+        Patron.patron_count = Patron.store.count()
 
     def is_existing_patron(self):
         """Check if this patron exists in the saved data."""
-        try:
-            with open(Patron.patrons_data_file, 'r') as file:
-                patrons_data = json.load(file)
-                return self.__name in patrons_data
-        except FileNotFoundError:
-            return False  # File not found implies a new patron
+        return Patron.store.exists(self.__name)
 
-    def borrow_item(self, item):
-        """Allows the patron to borrow an item if it’s available."""
-        item_already_borrowed = any(
-            i._title == item._title and i._item_type == item._item_type for i in self.checked_out_items
-        )
+    @property
+    def borrowed_count(self):
+        """Number of items the patron currently has checked out."""
+        return len(self.checked_out_items)
+
+    @property
+    def item_limit(self):
+        """Most items this patron may have checked out at once."""
+        return Patron.max_items_allowed(self.tier)
 
+    def set_tier(self, tier):
+        """Move the patron to another borrowing tier (saved with the patron's data)."""
+        if tier not in Patron.tier_limits:
+            raise ValueError(f"Unknown patron tier {tier!r}; expected one of {', '.join(Patron.tier_limits)}.")
+        self.tier = tier
+
+    @timed("patron.borrow_item")
+    def borrow_item(self, item):
+        """Allows the patron to borrow an item if it’s available; returns its desk ticket, or None."""
         # Check if patron has already borrowed this item
-        if item_already_borrowed:
+        if item in self.checked_out_items:
             print(f"{self.__name} has already borrowed '{item._title}'. Cannot borrow the same item twice.")
             return #Exit the function if the item is already borrowed
 
-        if len(self.checked_out_items) < Patron.max_items_allowed():
-            if item.available:
-                # Load staff info for the item type
-                staff_info = staff_assignment[item._item_type][item._title]
-                staff_name = staff_info["staff"]
-                staff_station = staff_info["station"]
+        if len(self.checked_out_items) < self.item_limit:
+            # Reserve a physical copy in the borrowing ledger, which every terminal shares, so two
+            # terminals can't lend the same copy; None means every copy is already out
+            date_borrowed = datetime.date.today()
+            due_date = date_borrowed + datetime.timedelta(days=30)
+            copy_id = append_borrowing_data(self.__name, item._title, date_borrowed, due_date, item._item_type,
+                                            copies=availability.copies(item._item_type, item._title))
+            availability.refresh_title(item._item_type, item._title)  # Bring this terminal's table in step
+            if copy_id is not None:
+                item.copy_id = copy_id
+                item.available = True  # Reserved above, whatever this terminal's table said before
+                # Send the patron to the staff member who handles this item (the least busy one, where
+                # desks report when they finish)
+                ticket = station_router.route(item._item_type, item._title, patron=self.__name)
+                staff_name = ticket.staff
+                staff_station = ticket.station
                 item.check_out()  # Check out the item and mark it unavailable
-                self.checked_out_items.append(item)  # Add to patron’s items
-                self.borrowed_count += 1  # Update borrowed count
+                self.checked_out_items.add(item)  # Add to patron’s items
 
                 print(f"\n{self.__name} borrowed a {item._item_type}.")
                 print(item)
-                print(f"This {item._item_type} is handled by {staff_name} at station {staff_station}. Please proceed to check out.\n")
-
-                # Log borrowing with due date
-                date_borrowed = datetime.date.today()
-                due_date = date_borrowed + datetime.timedelta(days=30)
-                append_borrowing_data(self.__name, item._title, date_borrowed, due_date, item._item_type)
+                if ticket.rerouted:
+                    print(f"{ticket.assigned_staff} is busy, so this {item._item_type} is handled by {staff_name} at station {staff_station}. Please proceed to check out.\n")
+                else:
+                    print(f"This {item._item_type} is handled by {staff_name} at station {staff_station}. Please proceed to check out.\n")
+                if not station_router.reports_completions:
+                    station_router.release(ticket)  # Nothing reports when the desk is done; the checkout is recorded
+                return ticket
             else:
+                item.available = False
                 print(f'{item._item_type} is not available.')
         else:
             print(f'{self.__name} has reached the max limit of borrowed items.')
 
+    @timed("patron.return_item")
     def return_item(self, item):
         """Allows the patron to return a borrowed item."""
-        item_found = any(i._title == item._title and i._item_type == item._item_type for i in self.checked_out_items)
-
-        if item_found:
-            item.return_item()  # Mark item as returned and update availability
-            # Remove from patron’s checked out items
-            self.checked_out_items = [i for i in self.checked_out_items if not (i._title == item._title and i._item_type == item._item_type)]
-
-            self.borrowed_count -= 1  # Update the borrowed count
-            print(f'{self.__name} returned a {item._item_type}.')
-            delete_borrowing_data(self.__name, item._title, item._item_type)  # Remove entry from borrowing data
+        # Remove from patron’s checked out items
+        borrowed = self.checked_out_items.remove(item._item_type, item._title)
+
+        if borrowed is not None:
+            # Close the loan in the ledger first; it may already have been returned at another desk
+            if delete_borrowing_data(self.__name, item._title, item._item_type):
+                item.copy_id = borrowed.copy_id
+                item.return_item()  # Mark item as returned and update availability
+                print(f'{self.__name} returned a {item._item_type}.')
+            else:
+                print(f"\n{self.__name}'s {item._item_type} '{item._title}' was already returned.")
+            availability.refresh_title(item._item_type, item._title)  # Put the copy back on the shelf
         else:
             print(f'\n{self.__name} does not have {item._item_type} checked out.')
 
@@ -93,76 +177,50 @@ class Patron:
         return cls.patron_count
 
     @staticmethod
-    def max_items_allowed():
-        """Defines the maximum allowed items a patron can borrow."""
-        return 5
+    def max_items_allowed(tier=None):
+        """Defines the maximum allowed items a patron of the given tier can borrow."""
+        return Patron.tier_limits[tier or Patron.default_tier]
 
+    @timed("patron.save")
     def save_patron_data(self):
-        """Save patron's checked out items and update the patron data file."""
-        try:
-            with open(Patron.patrons_data_file, 'r') as file:
-                patrons_data = json.load(file)
-        except FileNotFoundError:
-            patrons_data = {}
-
-        # Update patron's data with current checked out items
-        patrons_data[self.__name] = [{
-            "title": item._title, 
+        """Save patron's checked out items to this patron's record in the store."""
+        Patron.store.save(self.__name, [{
+            "title": item._title,
             "type": item._item_type,
             "publication_year": item.publication_year,
             "language": item.language,
             "shelf_location": item.shelf_location,
-            "condition": item.condition
-        } for item in self.checked_out_items]
-
-        # Order data and save patron count
-        ordered_data = {'patron_count': Patron.patron_count}
-
-        for patron in patrons_data:
-            if patron != 'patron_count':  # Ensure patron count is added first
-                ordered_data[patron] = patrons_data[patron]
-
-        with open(Patron.patrons_data_file, 'w') as file:
-            json.dump(ordered_data, file, indent=4)
+            "condition": item.condition,
+            "copy_id": item.copy_id
+        } for item in self.checked_out_items], self.tier)
 
     @classmethod
+    @timed("patron.load")
     def load_patron_data(cls, name):
         """Load patron’s saved data and checked-out items if they exist."""
-        try:
-            with open(cls.patrons_data_file, 'r') as file:
-                patrons_data = json.load(file)
-                
-                if name in patrons_data:
-                    patron = cls(name)
-                    
-                    for item_data in patrons_data[name]:
-                        title = item_data["title"]
-                        item_type = item_data["type"]
-                        publication_year = item_data.get("publication_year", "Unknown")
-                        language = item_data.get("language", "English")
-                        shelf_location = item_data.get("shelf_location", "General")
-                        condition = item_data.get("condition", "Good")
-                        
-                        # Initialize the item based on its type
-                        if item_type == "Book":
-                            item = Book(title, "Unknown Author", "Unknown Genre", "N/A", 0,
-                                        publication_year, language, shelf_location, condition)
-                        elif item_type == "Magazine":
-                            item = Magazine(title, "Unknown Issue", 0,
-                                            publication_year, language, shelf_location, condition)
-                        elif item_type == "DVD":
-                            item = DVD(title, "Unknown Director", "Unknown Genre", 0,
-                                       publication_year, language, shelf_location, condition)
-                        else:
-                            print(f"Unknown item type: {item_type}.")
-                            continue #Skip unknown item types
-                        
-                        patron.checked_out_items.append(item)
-                    return patron
-
-        except FileNotFoundError:
-            print("Patron data file not found. A new patron will be created.")
-        except json.JSONDecodeError:
-            print("Error decoding JSON data. Please check the file format.")
-        
-        return cls(name)  # Return new patron instance if data load fails or not found
\ No newline at end of file
+        record = cls.store.load_record(name)
+        patron = cls(name)
+        saved_items = None
+        if record is not None:
+            saved_items, patron.tier = record
+            if patron.tier not in cls.tier_limits:
+                print(f"Unknown patron tier: {patron.tier}; using {cls.default_tier}.")
+                patron.tier = cls.default_tier
+
+        for item_data in reconcile_items(name, saved_items):
+            title = item_data["title"]
+            item_type = item_data["type"]
+
+            # Rebuild the item from the shared catalog entry; only per-copy state is restored
+            if item_type not in ITEM_CLASSES:
+                print(f"Unknown item type: {item_type}.")
+                continue #Skip unknown item types
+            if title not in LibraryItem.get_all_items().get(item_type, {}):
+                print(f"'{title}' ({item_type}) is no longer in the catalog.")
+                continue
+            item = LibraryItem.from_catalog(item_type, title, item_data.get("condition", "Good"))
+            item.copy_id = item_data.get("copy_id")
+            item.available = False  # This copy is out with the patron
+
+            patron.checked_out_items.add(item)
+        return patron
@@ -0,0 +1,144 @@
+import json
+import os
+import sqlite3
+import sys
+from instrumentation import timed
+
+
+class PatronStore:
+    """Keyed patron records in an SQLite file, so one patron loads and saves without touching the rest."""
+
+    def __init__(self, filename='patrons.db', legacy_filename='patrons_data.json'):
+        self.filename = filename
+        self.legacy_filename = legacy_filename  # Old monolithic JSON file, imported on first open
+        self._connection = None
+
+    def _connect(self):
+        """Open the database on first use, creating the schema and migrating legacy data if needed."""
+        if self._connection is None:
+            is_new = not os.path.exists(self.filename)
+            self._connection = sqlite3.connect(self.filename, timeout=30)
+            # Write-ahead journal: a commit appends to patrons.db-wal instead of rewriting pages in
+            # place, and a crash rolls back to the last commit. NORMAL syncs at checkpoints only
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            with self._connection:
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS patrons (name TEXT PRIMARY KEY, items TEXT NOT NULL, "
+                    "tier TEXT NOT NULL DEFAULT 'standard')")
+                columns = [row[1] for row in self._connection.execute("PRAGMA table_info(patrons)")]
+                if "tier" not in columns:  # Databases created before patron tiers
+                    self._connection.execute(
+                        "ALTER TABLE patrons ADD COLUMN tier TEXT NOT NULL DEFAULT 'standard'")
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+                self._connection.execute(
+                    "INSERT OR IGNORE INTO meta (key, value) VALUES ('patron_count', 0)")
+            if is_new and self.legacy_filename and os.path.exists(self.legacy_filename):
+                self.migrate_from_json(self.legacy_filename)
+        return self._connection
+
+    def count(self):
+        """Return the number of stored patrons (maintained on insert, not counted)."""
+        row = self._connect().execute("SELECT value FROM meta WHERE key = 'patron_count'").fetchone()
+        return row[0] if row else 0
+
+    def exists(self, name):
+        """Check whether a patron has a stored record."""
+        row = self._connect().execute("SELECT 1 FROM patrons WHERE name = ?", (name,)).fetchone()
+        return row is not None
+
+    @timed("patron_store.load")
+    def load(self, name):
+        """Return the patron's saved item list, or None if the patron has no record."""
+        row = self._connect().execute("SELECT items FROM patrons WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    @timed("patron_store.load")
+    def load_record(self, name):
+        """Return (item list, tier) for the patron, or None if the patron has no record."""
+        row = self._connect().execute("SELECT items, tier FROM patrons WHERE name = ?", (name,)).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    @timed("patron_store.save")
+    def save(self, name, items, tier=None):
+        """Insert or replace one patron's item list (and tier, if given), bumping the patron count for new patrons."""
+        connection = self._connect()
+        encoded = json.dumps(items)
+        with connection:
+            # INSERT first so the write lock is taken before deciding whether the patron is new;
+            # two terminals saving the same new patron can't both count it
+            inserted = connection.execute(
+                "INSERT OR IGNORE INTO patrons (name, items, tier) VALUES (?, ?, ?)",
+                (name, encoded, tier or "standard")).rowcount
+            if inserted:
+                connection.execute("UPDATE meta SET value = value + 1 WHERE key = 'patron_count'")
+            elif tier is None:
+                connection.execute("UPDATE patrons SET items = ? WHERE name = ?", (encoded, name))
+            else:
+                connection.execute("UPDATE patrons SET items = ?, tier = ? WHERE name = ?", (encoded, tier, name))
+
+    @timed("patron_store.load_many")
+    def load_many(self, names, chunk_size=500):
+        """Return {name: item list} for the given patrons that have a record, querying in chunks."""
+        names = list(names)
+        found = {}
+        connection = self._connect()
+        for start in range(0, len(names), chunk_size):
+            chunk = names[start:start + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            for name, items in connection.execute(
+                    f"SELECT name, items FROM patrons WHERE name IN ({placeholders})", chunk):
+                found[name] = json.loads(items)
+        return found
+
+    @timed("patron_store.save_many")
+    def save_many(self, records):
+        """Save several (name, items) pairs in one transaction, counting any new patrons."""
+        connection = self._connect()
+        with connection:
+            for name, items in records:
+                encoded = json.dumps(items)
+                inserted = connection.execute(
+                    "INSERT OR IGNORE INTO patrons (name, items) VALUES (?, ?)", (name, encoded)).rowcount
+                if inserted:
+                    connection.execute("UPDATE meta SET value = value + 1 WHERE key = 'patron_count'")
+                else:
+                    connection.execute("UPDATE patrons SET items = ? WHERE name = ?", (encoded, name))
+
+    def names(self):
+        """Yield all stored patron names."""
+        for (name,) in self._connect().execute("SELECT name FROM patrons ORDER BY name"):
+            yield name
+
+    def migrate_from_json(self, json_filename):
+        """Import every patron from a legacy patrons_data.json file."""
+        with open(json_filename, 'r') as file:
+            patrons_data = json.load(file)
+
+        connection = self._connect()
+        with connection:
+            for name, items in patrons_data.items():
+                if name == 'patron_count':
+                    continue
+                connection.execute("INSERT OR REPLACE INTO patrons (name, items) VALUES (?, ?)",
+                                   (name, json.dumps(items)))
+            stored = connection.execute("SELECT COUNT(*) FROM patrons").fetchone()[0]
+            # Keep the legacy count if it was higher (it also counted patrons that never saved)
+            patron_count = max(stored, patrons_data.get('patron_count', 0))
+            connection.execute("UPDATE meta SET value = ? WHERE key = 'patron_count'", (patron_count,))
+        return stored
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+if __name__ == '__main__':
+    # Usage: python patron_store.py [patrons_data.json] [patrons.db]
+    json_filename = sys.argv[1] if len(sys.argv) > 1 else 'patrons_data.json'
+    db_filename = sys.argv[2] if len(sys.argv) > 2 else 'patrons.db'
+    store = PatronStore(db_filename, legacy_filename=None)
+    migrated = store.migrate_from_json(json_filename)
+    print(f"Migrated {migrated} patrons from {json_filename} to {db_filename}.")
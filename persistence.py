@@ -0,0 +1,56 @@
+import sys
+import time
+from borrowing_ledger import get_ledger
+from library_item import LibraryItem, ITEM_FIELDS
+from patron import Patron
+from instrumentation import timed
+
+ITEM_TYPES = tuple(ITEM_FIELDS)
+
+# Circulation state on disk, and how each piece survives a crash:
+#   borrowing_ledger_<type>.snapshot + .log   open loans: snapshot plus a write-ahead log of borrows/returns
+#   item_count.json + item_count.log          item count: last saved count plus a log of changes since
+#   patrons.db (+ -wal)                       patron records: SQLite in write-ahead-log mode
+# The ledgers are the record of every loan; patron records are brought in step with them on load.
+# recover() reads the snapshots and replays the logs; checkpoint() folds the logs into new
+# snapshots, so the next recovery has less to replay
+
+
+# Loads every snapshot and replays the logs written since. Returns {step: seconds}
+@timed("persistence.recover")
+def recover(item_types=ITEM_TYPES):
+    timings = {}
+    for item_type in item_types:
+        start = time.perf_counter()
+        get_ledger(item_type).load()
+        timings[f"ledger_{item_type.lower()}"] = time.perf_counter() - start
+    start = time.perf_counter()
+    LibraryItem.initialize_item_count()
+    timings["item_count"] = time.perf_counter() - start
+    return timings
+
+
+# Writes fresh snapshots (every open loan, the current item count) and empties the logs
+@timed("persistence.checkpoint")
+def checkpoint(item_types=ITEM_TYPES):
+    for item_type in item_types:
+        get_ledger(item_type).compact()
+    LibraryItem.save_item_count()
+    connection = Patron.store._connect()
+    connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+if __name__ == '__main__':
+    # Usage: python persistence.py recover | checkpoint
+    command = sys.argv[1] if len(sys.argv) > 1 else "recover"
+    if command == "recover":
+        for step, seconds in recover().items():
+            print(f"{step}: {seconds * 1000:.1f} ms")
+        print(f"Open loans: {sum(len(get_ledger(item_type).open_loans) for item_type in ITEM_TYPES)}, "
+              f"available items: {LibraryItem.total_items()}")
+    elif command == "checkpoint":
+        recover()
+        checkpoint()
+        print("Checkpoint written.")
+    else:
+        print("Usage: python persistence.py recover | checkpoint")
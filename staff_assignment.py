@@ -1,7 +1,23 @@
 import json
+from catalog_cache import CatalogCache, LazyCatalog
+from instrumentation import register_collector
 
 def load_staff_assignment_from_file(filename):
     with open(filename, 'r') as file:
         return json.load(file)
 
-staff_assignment = load_staff_assignment_from_file('staff_assignment.txt')
\ No newline at end of file
+# Shared in-memory catalog; re-read only when staff_assignment.txt changes on disk
+catalog = CatalogCache('staff_assignment.txt', check_interval=1.0)
+
+# Parsed on first access rather than at import, so importing the package stays cheap
+staff_assignment = LazyCatalog(catalog)
+
+
+# Catalog lookups are already counted by the cache; report them with the other metrics
+def _catalog_metrics():
+    return [("library_catalog_lookups_total", "counter", "Catalog lookups, by how they were served.",
+             {"result": result}, getattr(catalog, attribute))
+            for result, attribute in (("memory", "hits"), ("load", "misses"), ("reload", "reloads"))]
+
+
+register_collector(_catalog_metrics)
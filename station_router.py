@@ -0,0 +1,265 @@
+import itertools
+import threading
+import time
+from collections import deque
+from staff_assignment import catalog
+from catalog_cache import CatalogListener
+from instrumentation import register_collector
+
+
+# One checkout routed to a staff member's queue
+class Ticket:
+    __slots__ = ('id', 'staff', 'station', 'assigned_staff', 'item_type', 'title', 'queued_at', 'started_at',
+                 'expected_start', 'expected_finish', 'done', 'patron')
+
+    def __init__(self, staff, station, assigned_staff, item_type, title, queued_at, expected_start,
+                 expected_finish, patron=None, ticket_id=None):
+        self.id = ticket_id  # Router-assigned number, for desks that report start and completion by id
+        self.staff = staff
+        self.station = station
+        self.assigned_staff = assigned_staff  # Staff the catalog names for this item
+        self.item_type = item_type
+        self.title = title
+        self.queued_at = queued_at
+        self.started_at = None  # Set by StationRouter.start when service actually begins
+        self.expected_start = expected_start
+        self.expected_finish = expected_finish
+        self.done = False  # Completed, or dropped from the queue after its expected finish
+        self.patron = patron  # Patron being checked out, if known
+
+    @property
+    def rerouted(self):
+        return self.staff != self.assigned_staff
+
+    @property
+    def estimated_wait(self):
+        return self.expected_start - self.queued_at
+
+
+# Queue and service-time statistics for one staff member
+class _Desk:
+    def __init__(self, staff, station, service_time):
+        self.staff = staff
+        self.station = station
+        self.item_types = set()  # Item types this staff member handles in the catalog
+        self.queue = deque()  # Open tickets, oldest first
+        self.service_time = service_time  # Moving average of measured service times (seconds)
+        self.served = 0
+        self.total_wait = 0.0
+
+    def finish(self, ticket, started):
+        ticket.done = True
+        self.served += 1
+        self.total_wait += started - ticket.queued_at
+
+    # Drops tickets that are well past their expected finish, so a desk that never reports
+    # completions still drains on schedule. Returns the dropped tickets
+    def expire(self, now, grace):
+        expired = []
+        while self.queue and self.queue[0].expected_finish + grace <= now:
+            ticket = self.queue.popleft()
+            self.finish(ticket, ticket.started_at if ticket.started_at is not None else ticket.expected_start)
+            expired.append(ticket)
+        return expired
+
+    # Recomputes expected start and finish times of the queued tickets from the current average
+    def reschedule(self, now):
+        previous_finish = now
+        for ticket in self.queue:
+            if ticket.started_at is None:
+                ticket.expected_start = max(ticket.queued_at, previous_finish)
+            ticket.expected_finish = max(ticket.expected_start + self.service_time, now)
+            previous_finish = ticket.expected_finish
+
+    # When the desk could start a new checkout. The given patron's own tickets don't count: they are
+    # at this desk already, not queued ahead of themselves
+    def free_at(self, now, patron=None):
+        if patron is None:
+            return max(now, self.queue[-1].expected_finish) if self.queue else now
+        free = now
+        for ticket in self.queue:
+            if ticket.patron == patron:
+                continue
+            if ticket.started_at is not None:
+                free = max(free, ticket.expected_finish)
+            else:
+                free = max(free, ticket.queued_at) + self.service_time
+        return free
+
+
+# Sends each checkout to the eligible staff member with the shortest expected wait. The staff
+# member the catalog assigns to an item is kept unless another desk that handles the same item
+# type would serve the patron more than preference_slack seconds sooner. Expected waits come from
+# each desk's queue and its moving-average service time; start() and complete() feed measured
+# times back, and tickets that are never completed drop off once their expected finish passes.
+# Rebalancing needs those completion events, so it is on only where something reports them
+# (reports_completions: the circulation server, whose desk clients send start/complete for a ticket
+# id); elsewhere, as in a single CLI terminal, a checkout stays with its assigned staff member and
+# its ticket is released as soon as the checkout is recorded
+class StationRouter(CatalogListener):
+    default_service_time = 90.0  # Seconds per checkout before any have been measured
+    preference_slack = 30.0  # Extra wait accepted to stay with the assigned staff member
+    smoothing = 0.2  # Weight of the newest measurement in the service-time average
+    expiry_grace = 60.0  # Seconds past its expected finish before an uncompleted ticket is dropped
+    reports_completions = False  # True where start()/complete() are called as desks serve patrons
+
+    def __init__(self, source=catalog, clock=time.monotonic):
+        self.clock = clock
+        self._desks = {}  # staff name -> _Desk
+        self._by_type = {}  # item_type -> [_Desk]
+        self._open = {}  # ticket id -> Ticket still queued
+        self._ticket_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        super().__init__(source)
+
+    # Registers every staff member and station named in the catalog, keeping existing queues
+    def rebuild(self, all_items=None):
+        if all_items is None:
+            all_items = self.source.get()
+        for desk in self._desks.values():
+            desk.item_types.clear()
+        for item_type, items in all_items.items():
+            for details in items.values():
+                self._register(item_type, details)
+        self._by_type = {}
+        for desk in self._desks.values():
+            for item_type in desk.item_types:
+                self._by_type.setdefault(item_type, []).append(desk)
+        self._generation = self.source.generation
+
+    # Notes that the staff member a catalog record names handles its item type; returns the desk
+    def _register(self, item_type, details):
+        staff = details.get("staff")
+        if staff is None:
+            return None
+        desk = self._desks.get(staff)
+        if desk is None:
+            desk = self._desks[staff] = _Desk(staff, details.get("station"), self.default_service_time)
+        desk.item_types.add(item_type)
+        return desk
+
+    # Registers the staff member of an item added to the catalog (a rebuild sorts out removals)
+    def add_item(self, item_type, title, details, previous=None):
+        if not self.built:
+            return  # Not built yet; the first checkout registers every desk
+        with self._lock:
+            desk = self._register(item_type, details)
+            desks = self._by_type.setdefault(item_type, [])
+            if desk is not None and desk not in desks:
+                desks.append(desk)
+
+    # Chooses a staff member for a checkout and queues it there. With rebalance=False every
+    # checkout goes to the assigned staff member (the old static routing); by default it rebalances
+    # where completions are reported. patron's own earlier tickets never count as load. Returns a Ticket
+    def route(self, item_type, title, rebalance=None, patron=None):
+        if rebalance is None:
+            rebalance = self.reports_completions
+        with self._lock:
+            self._ensure_current()
+            details = self.source.get()[item_type][title]
+            now = self.clock()
+            assigned = self._desks[details["staff"]]
+            chosen = assigned
+            if rebalance:
+                candidates = self._by_type.get(item_type, [assigned])
+                for desk in candidates:
+                    self._expire(desk, now)
+                best = min(candidates, key=lambda desk: desk.free_at(now, patron))
+                if best.free_at(now, patron) + self.preference_slack < assigned.free_at(now, patron):
+                    chosen = best
+            else:
+                self._expire(assigned, now)
+            start = chosen.free_at(now, patron)
+            ticket = Ticket(chosen.staff, chosen.station, assigned.staff, item_type, title, now, start,
+                            start + chosen.service_time, patron, next(self._ticket_ids))
+            chosen.queue.append(ticket)
+            self._open[ticket.id] = ticket
+            return ticket
+
+    # Drops a desk's overdue tickets (see _Desk.expire)
+    def _expire(self, desk, now):
+        for ticket in desk.expire(now, self.expiry_grace):
+            self._open.pop(ticket.id, None)
+
+    # Returns the queued ticket with this id, or None if it was completed, released or dropped
+    def find(self, ticket_id):
+        with self._lock:
+            return self._open.get(ticket_id)
+
+    # Marks the start of service for a ticket (the patron reached the desk)
+    def start(self, ticket):
+        with self._lock:
+            now = self.clock()
+            ticket.started_at = now
+            ticket.expected_start = now
+            if not ticket.done:
+                self._desks[ticket.staff].reschedule(now)
+
+    # Marks a ticket as served: its measured service time updates the desk's average, and the
+    # tickets queued behind it are rescheduled
+    def complete(self, ticket):
+        with self._lock:
+            now = self.clock()
+            desk = self._desks[ticket.staff]
+            started = ticket.started_at if ticket.started_at is not None else min(ticket.expected_start, now)
+            desk.service_time += self.smoothing * (now - started - desk.service_time)
+            if not ticket.done:
+                desk.queue.remove(ticket)
+                desk.finish(ticket, started)
+                self._open.pop(ticket.id, None)
+            desk.reschedule(now)
+
+    # Takes a ticket off its desk's queue without timing it, where nothing reports when service ends.
+    # The service-time average is left as it was
+    def release(self, ticket):
+        with self._lock:
+            if ticket.done:
+                return
+            desk = self._desks[ticket.staff]
+            desk.queue.remove(ticket)
+            desk.finish(ticket, min(ticket.expected_start, self.clock()))
+            self._open.pop(ticket.id, None)
+            desk.reschedule(self.clock())
+
+    # Live per-staff and per-station figures
+    def metrics(self):
+        with self._lock:
+            self._ensure_current()
+            now = self.clock()
+            staff, stations = {}, {}
+            for desk in self._desks.values():
+                self._expire(desk, now)
+                staff[desk.staff] = {
+                    "station": desk.station,
+                    "queue_depth": len(desk.queue),
+                    "estimated_wait": desk.free_at(now) - now,
+                    "service_time": desk.service_time,
+                    "served": desk.served,
+                    "mean_wait": desk.total_wait / desk.served if desk.served else 0.0,
+                }
+                station = stations.setdefault(desk.station, {"staff": [], "queue_depth": 0})
+                station["staff"].append(desk.staff)
+                station["queue_depth"] += len(desk.queue)
+            return {"staff": staff, "stations": stations}
+
+
+# Shared router for checkouts in this process
+station_router = StationRouter()
+
+
+# Live desk queues for the metrics export
+def _router_metrics():
+    if not station_router.built:
+        return []  # No checkout routed yet
+    staff = station_router.metrics()["staff"]
+    samples = []
+    for name, figures in staff.items():
+        labels = {"staff": name, "station": figures["station"]}
+        samples.append(("library_staff_queue_depth", "gauge", "Checkouts queued per staff member.", labels,
+                        figures["queue_depth"]))
+        samples.append(("library_staff_estimated_wait_seconds", "gauge", "Expected wait for a new checkout.",
+                        labels, figures["estimated_wait"]))
+    return samples
+
+
+register_collector(_router_metrics)
@@ -0,0 +1,242 @@
+import heapq
+from array import array
+from bisect import bisect_left
+from operator import itemgetter
+from staff_assignment import catalog
+from catalog_cache import CatalogListener
+from instrumentation import timed
+
+SEARCH_FIELDS = ("author", "director")  # Catalog fields searched alongside the title
+
+
+# Lower-cases and collapses whitespace so "The  Great gatsby" matches "The Great Gatsby"
+def normalize(text):
+    return " ".join(str(text).lower().split())
+
+
+# Returns the set of padded character trigrams of normalized text
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# Dice coefficient of two trigram sets (1.0 = identical)
+def similarity(grams, other_grams):
+    return 2 * len(grams & other_grams) / (len(grams) + len(other_grams))
+
+
+# Returns every variant of word with one character deleted
+def deletions(word):
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+# Title search across every item type: prefix lookups for autocomplete (a sorted key list with
+# binary search, which gives trie-style O(log n + k) prefix scans without a node per character)
+# and typo-tolerant matching. Fuzzy candidates come from a word index plus a one-deletion
+# neighbourhood of the vocabulary (so a misspelled word finds its correction with a few dict
+# lookups), and are ranked by trigram similarity to the query. An entry too unlike the query as a
+# whole is scored on the run of its words that matches the query best instead
+class TitleSearch(CatalogListener):
+    max_candidates = 2000  # Upper bound on fuzzy candidates verified per query
+    insert_limit = 256  # Entries added since the last query are inserted one by one up to this many, else merged
+    window_weight = 0.9  # A match on part of an entry ranks below an equally close whole-entry match
+
+    def __init__(self, fields=SEARCH_FIELDS, source=catalog):
+        self.fields = tuple(fields)
+        self._reset()
+        super().__init__(source)
+
+    def _reset(self):
+        self._entries = []  # entry id -> (item_type, title, field, normalized text)
+        self._ids = {}  # (item_type, title) -> [entry ids]
+        self._deleted = set()  # Entry ids of removed items
+        self._prefix_keys = []  # Sorted normalized texts
+        self._prefix_ids = []  # Entry id for each key in _prefix_keys
+        self._unsorted = []  # (normalized text, entry id) added since the last query, not yet in _prefix_keys
+        self._postings = {}  # word -> array of entry ids containing it
+        self._deletion_index = {}  # vocabulary word with one character deleted -> [words]
+
+    # Rebuilds the index from the catalog
+    @timed("title_search.rebuild")
+    def rebuild(self, all_items=None):
+        if all_items is None:
+            all_items = self.source.get()
+        self._reset()
+        pairs = []
+        for item_type, items in all_items.items():
+            for title, details in items.items():
+                for entry_id in self._add_entries(item_type, title, details):
+                    pairs.append((self._entries[entry_id][3], entry_id))
+        pairs.sort()
+        self._prefix_keys = [key for key, _ in pairs]
+        self._prefix_ids = array('i', (entry_id for _, entry_id in pairs))
+        self._generation = self.source.generation
+
+    # Adds title (and author/director) entries for one item to the trigram index; returns their ids
+    def _add_entries(self, item_type, title, details):
+        added = []
+        texts = [("title", title)] + [(field, details[field]) for field in self.fields if details.get(field)]
+        for field, text in texts:
+            normalized = normalize(text)
+            entry_id = len(self._entries)
+            self._entries.append((item_type, title, field, normalized))
+            for word in set(normalized.split()):
+                postings = self._postings.get(word)
+                if postings is None:
+                    postings = self._postings[word] = array('i')
+                    for variant in deletions(word):
+                        self._deletion_index.setdefault(variant, []).append(word)
+                postings.append(entry_id)
+            added.append(entry_id)
+        self._ids.setdefault((item_type, title), []).extend(added)
+        return added
+
+    # Rebuilds after a reload, then files the entries added since the last query into the sorted keys
+    def _ensure_current(self):
+        super()._ensure_current()
+        if self._unsorted:
+            self._sort_added()
+
+    # Adds the pending entries to the sorted prefix keys: one insert each for a few, one merge pass for
+    # a batch (e.g. a bulk import), so adding k entries costs O(n + k log k) rather than O(n * k)
+    def _sort_added(self):
+        added, self._unsorted = sorted(self._unsorted), []
+        if len(added) <= self.insert_limit:
+            for key, entry_id in added:
+                position = bisect_left(self._prefix_keys, key)
+                self._prefix_keys.insert(position, key)
+                self._prefix_ids.insert(position, entry_id)
+            return
+        merged = list(heapq.merge(zip(self._prefix_keys, self._prefix_ids), added, key=itemgetter(0)))
+        self._prefix_keys = [key for key, _ in merged]
+        self._prefix_ids = array('i', (entry_id for _, entry_id in merged))
+
+    # Indexes an item that was just added to the catalog. Its prefix keys are sorted in on the next query
+    def add_item(self, item_type, title, details, previous=None):
+        if not self.built:
+            return  # Not built yet; the first query builds from the full catalog
+        self.remove_item(item_type, title, previous)
+        for entry_id in self._add_entries(item_type, title, details):
+            self._unsorted.append((self._entries[entry_id][3], entry_id))
+
+    # Hides an item that was just removed from the catalog
+    def remove_item(self, item_type, title, details=None):
+        if not self.built:
+            return
+        self._deleted.update(self._ids.pop((item_type, title), ()))
+
+    # Returns up to limit (item_type, title) pairs whose title, author or director starts with text
+    @timed("title_search.prefix")
+    def prefix(self, text, limit=10, item_type=None):
+        self._ensure_current()
+        key = normalize(text)
+        results = {}
+        position = bisect_left(self._prefix_keys, key)
+        while position < len(self._prefix_keys) and len(results) < limit:
+            if not self._prefix_keys[position].startswith(key):
+                break
+            entry_id = self._prefix_ids[position]
+            position += 1
+            if entry_id in self._deleted:
+                continue
+            entry = self._entries[entry_id]
+            if item_type is None or entry[0] == item_type:
+                results.setdefault((entry[0], entry[1]), None)
+        return list(results)
+
+    # Returns vocabulary words within one edit (insert, delete, substitute, transpose) of word
+    def _word_variants(self, word):
+        variants = {word} if word in self._postings else set()
+        for variant in deletions(word):
+            if variant in self._postings:
+                variants.add(variant)  # Query has an extra character
+            variants.update(self._deletion_index.get(variant, ()))  # Substitution or transposition
+        variants.update(self._deletion_index.get(word, ()))  # Query is missing a character
+        return variants
+
+    # Returns up to limit (score, item_type, title) for entries similar to text, best first.
+    # score is the Dice coefficient of the trigram sets (1.0 = identical) against the whole entry or,
+    # if that is below min_score, against the run of as many of its words as the query has (weighted
+    # by window_weight)
+    @timed("title_search.fuzzy")
+    def fuzzy(self, text, limit=10, item_type=None, min_score=0.35):
+        self._ensure_current()
+        query = normalize(text)
+        if not query:
+            return []
+        query_grams = trigrams(query)
+
+        # Entries containing each query word (allowing one typo per word), rarest words first. Candidates
+        # are narrowed to entries holding several query words for as long as enough of them remain, so
+        # one badly misspelled word doesn't hide the match
+        per_word = []
+        for word in set(query.split()):
+            lists = [self._postings[variant] for variant in self._word_variants(word)]
+            size = sum(len(postings) for postings in lists)
+            if size:
+                per_word.append((size, lists))
+        per_word.sort(key=lambda pair: pair[0])
+        candidates = None
+        preferred = set()  # Candidates that also hold the next query word, when too few for narrowing
+        for _, lists in per_word[:3]:
+            matched = set()
+            for postings in lists:
+                matched.update(postings[:self.max_candidates])
+            if candidates is None:
+                candidates = matched
+                continue
+            narrowed = candidates & matched
+            if len(narrowed) < limit:
+                preferred = narrowed
+                break
+            candidates = narrowed
+        if candidates and (item_type is not None or self._deleted):
+            candidates = {entry_id for entry_id in candidates if entry_id not in self._deleted
+                          and (item_type is None or self._entries[entry_id][0] == item_type)}
+            preferred &= candidates
+        if not candidates:
+            return []
+
+        # Only the candidates closest in length to the query are ranked by trigram similarity
+        length = len(query)
+        candidates = list(preferred) + heapq.nsmallest(
+            limit * 2, candidates - preferred, key=lambda entry_id: abs(len(self._entries[entry_id][3]) - length))
+
+        query_words = len(query.split())
+        best = {}
+        for entry_id in candidates:
+            entry = self._entries[entry_id]
+            score = similarity(query_grams, trigrams(entry[3]))
+            words = entry[3].split()
+            if score < min_score and len(words) > query_words:
+                # Score the words the query matched instead, so one misspelled word of a long title
+                # ("gatbsy") isn't outweighed by the rest of the title
+                window = max(similarity(query_grams, trigrams(" ".join(words[i:i + query_words])))
+                             for i in range(len(words) - query_words + 1))
+                score = max(score, window * self.window_weight)
+            if entry[2] != "title":
+                score *= 0.9  # Prefer title matches over author/director matches
+            key = (entry[0], entry[1])
+            if score >= min_score and score > best.get(key, 0):
+                best[key] = score
+        ranked = sorted(((score, key[0], key[1]) for key, score in best.items()), key=lambda hit: -hit[0])
+        return ranked[:limit]
+
+    # Desk search: exact title matches first, then prefix (autocomplete) matches, then fuzzy matches.
+    # Returns up to limit (item_type, title) pairs
+    def search(self, text, limit=10, item_type=None):
+        results = {}
+        all_items = self.source.get()
+        for candidate_type in ([item_type] if item_type else all_items):
+            if text.strip() in all_items.get(candidate_type, {}):
+                results[(candidate_type, text.strip())] = None
+        for key in self.prefix(text, limit, item_type):
+            results.setdefault(key, None)
+        if len(results) < limit:
+            for _, found_type, title in self.fuzzy(text, limit, item_type):
+                results.setdefault((found_type, title), None)
+        return list(results)[:limit]
+
+
+# Shared title search over the library catalog
+title_search = TitleSearch()